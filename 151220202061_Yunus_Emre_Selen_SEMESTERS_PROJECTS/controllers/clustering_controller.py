@@ -1,12 +1,17 @@
 # controllers/clustering_controller.py
 
+import threading
+from collections import OrderedDict
+from functools import partial
 import numpy as np
+from PyQt5.QtCore import Qt, QThreadPool
 from PyQt5.QtWidgets import (
-    QMessageBox, QDialog, QFormLayout, QSpinBox,
-    QComboBox, QLineEdit, QPushButton
+    QApplication, QMessageBox, QDialog, QFormLayout, QSpinBox,
+    QComboBox, QPushButton
 )
 from .commands import SetInitialSolutionCommand
-from utils import calculate_objective, find_cluster_hub_nodes
+from .workers import Worker
+from utils import format_cluster_indices
 
 class KMeansParamDialog(QDialog):
     """
@@ -40,7 +45,9 @@ class KMeansParamDialog(QDialog):
         form.addRow("init:", self.combo_init)
 
         # Maximum iterations input
-        self.edit_max = QLineEdit("300")
+        self.edit_max = QSpinBox()
+        self.edit_max.setRange(1, 100000)
+        self.edit_max.setValue(300)
         form.addRow("max_iter:", self.edit_max)
 
         # Algorithm selection dropdown
@@ -62,7 +69,7 @@ class KMeansParamDialog(QDialog):
         return {
             "n_clusters": self.spin_n.value(),
             "init": self.combo_init.currentText(),
-            "max_iter": int(self.edit_max.text()),
+            "max_iter": self.edit_max.value(),
             "algorithm": self.combo_algo.currentText()
         }
 
@@ -75,6 +82,9 @@ class ClusteringController:
     and coordinating with the UI to apply clustering algorithms like K-Means, DBSCAN, etc.
     """
 
+    # Number of finished clustering results kept for repeated runs
+    CACHE_SIZE = 4
+
     def __init__(self, ui, service, app, cmd_mgr):
         """
         @brief Initializes the ClusteringController.
@@ -92,9 +102,21 @@ class ClusteringController:
         self.app = app
         self.cmd = cmd_mgr
 
+        # Scratch buffers of the hub/objective calculation, one set per pool thread so that a
+        # cancelled run still finishing in the background never shares them with a new run
+        self._buffers = threading.local()
+
+        # Cancel token of the clustering run in progress
+        self._cancel_event = None
+
+        # Recent results keyed by (data, method, params), oldest first
+        self._cluster_cache = OrderedDict()
+
+        # Heuristic menu actions, collected once
+        self._heuristic_actions = tuple(ui.menuHeuristic.actions())
+
         # Initially disable heuristic menus
-        ui.actionHillClimbing.setEnabled(False)
-        ui.actionSimulatedAnnealing.setEnabled(False)
+        self._set_heuristics_enabled(False)
 
         # Connect menu items to respective clustering methods
         ui.actionKMeans.triggered.connect(lambda: self._cluster_with_params('kmeans'))
@@ -105,7 +127,27 @@ class ClusteringController:
             (ui.actionHierarchical, 'hierarchical'),
             (ui.actionDBSCAN, 'dbscan'),
         ]:
-            act.triggered.connect(lambda _, m=method: self.cluster(m))
+            act.triggered.connect(partial(self._on_triggered, method))
+
+    def _set_heuristics_enabled(self, enabled):
+        """
+        @brief Enables or disables the heuristic menu actions, skipping those already in that state.
+
+        @param enabled: The enabled state to set.
+        """
+        for act in self._heuristic_actions:
+            if act.isEnabled() != enabled:
+                act.setEnabled(enabled)
+
+    def _on_triggered(self, method, *_):
+        """
+        @brief Runs a clustering method from its menu action.
+
+        Connected through `functools.partial`; the `checked` flag sent by `triggered` is ignored.
+
+        @param method: The clustering method bound to the action.
+        """
+        self.cluster(method)
 
     def _cluster_with_params(self, method):
         """
@@ -125,8 +167,11 @@ class ClusteringController:
         """
         @brief Executes the clustering algorithm and handles the results.
 
-        This method runs the selected clustering algorithm with the provided parameters,
-        processes the results, and updates the UI accordingly.
+        This method starts the selected clustering algorithm with the provided parameters in the
+        background and returns immediately; the results are processed and shown by `_on_clustered`
+        once the run finishes. Starting a new run cancels the one still in progress.
+        Running the same method with the same parameters on the same data again reuses the
+        earlier result instead of fitting the model again.
 
         @param method: The clustering algorithm method to apply (e.g., 'kmeans').
         @param params: The parameters for the clustering algorithm (e.g., n_clusters, init, etc.).
@@ -136,44 +181,115 @@ class ClusteringController:
             QMessageBox.warning(self.app.main_window, "Error", "Önce veri yükleyin.")
             return
 
-        df = self.app.initial_solution.data
+        base = self.app.initial_solution
+        key = (id(base.data), method, tuple(sorted(params.items())))
+
+        # 2) Reuse a recent result, or run the model in the background
+        hit = self._cluster_cache.get(key)
+        if hit is not None and hit.data is base.data:
+            self._cluster_cache.move_to_end(key)
+            self.cancel()
+            self._on_clustered(method, base.data, hit, None)
+            return
+        self.ui.txtInfoPanel.setPlainText(f"Clustering: {method.capitalize()} (running...)")
+        self._run_cluster_async(method, base, params, partial(self._on_clustered, method, base.data, key=key))
+
+    def cancel(self):
+        """
+        @brief Cancels the clustering run in progress, if any.
+
+        The service checks the cancel token between its stages; the result of a cancelled
+        run is discarded.
+        """
+        if self._cancel_event is not None:
+            self._cancel_event.set()
+            self._cancel_event = None
+
+    def _run_cluster_async(self, method, base, params, done_cb):
+        """
+        @brief Runs the clustering service (model fit, hubs and objective) on the thread pool.
+
+        NumPy and scikit-learn release the GIL for their numeric work, so the UI stays responsive
+        while the model is fitted. `done_cb(sol, error)` is called on the UI thread when the run
+        ends, unless it was cancelled.
 
-        # 2) Run the model and catch errors
-        try:
-            sol = self.svc.cluster(method, df, **params)
-        except ValueError as e:
-            msg = str(e)
+        @param method: The clustering algorithm method to apply.
+        @param base: The `Solution` whose data should be clustered.
+        @param params: The parameters for the clustering algorithm.
+        @param done_cb: Callback receiving the resulting `Solution` (or None) and the raised exception (or None).
+        """
+        self.cancel()
+        cancel = self._cancel_event = threading.Event()
+        df = base.data
+        # Data array and row norms computed once per dataset (shared by all its solutions)
+        X, x_sq = base.X, base.x_sq
+
+        def job():
+            out = getattr(self._buffers, 'out', None)
+            if out is None:
+                out = self._buffers.out = {}
+            # 3) Fit the model; the service also calculates the hubs and the objective
+            return self.svc.cluster(method, df, X=X, x_sq=x_sq, cancel=cancel, out=out, **params)
+
+        def finish(sol, error):
+            QApplication.restoreOverrideCursor()
+            if cancel.is_set():
+                return
+            self._cancel_event = None
+            done_cb(sol, error)
+
+        worker = Worker(job)
+        worker.signals.finished.connect(lambda sol: finish(sol, None))
+        worker.signals.error.connect(lambda e: finish(None, e))
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        QThreadPool.globalInstance().start(worker)
+
+    def _on_clustered(self, method, df, sol, error, key=None):
+        """
+        @brief Applies a finished clustering run and updates the UI.
+
+        @param method: The clustering algorithm method that was applied.
+        @param df: The DataFrame the run was started on.
+        @param sol: The resulting `Solution`, or None if the run failed.
+        @param error: The exception raised by the run, or None if it succeeded.
+        @param key: Cache key of the run; a successful result is kept under it.
+        """
+        if isinstance(error, ValueError):
+            msg = str(error)
             QMessageBox.critical(self.app.main_window, "Clustering Error", msg)
-            self.ui.txtInfoPanel.clear()
-            self.ui.txtInfoPanel.append(f"Error: {msg}")
+            self.ui.txtInfoPanel.setPlainText(f"Error: {msg}")
             return
-        except Exception as e:
-            msg = f"Beklenmeyen hata: {e}"
+        if error is not None:
+            msg = f"Beklenmeyen hata: {error}"
             QMessageBox.critical(self.app.main_window, "Clustering Error", msg)
-            self.ui.txtInfoPanel.clear()
-            self.ui.txtInfoPanel.append(msg)
+            self.ui.txtInfoPanel.setPlainText(msg)
             return
 
-        # 3) Calculate hubs and objective
-        hubs, hub_idxs = find_cluster_hub_nodes(df.values, sol.labels, sol.cluster_labels)
-        sol.hubs = hubs
-        sol.hub_indices = hub_idxs
-        sol.objective = calculate_objective(df.values, sol.labels, hubs, sol.cluster_labels)
+        # Drop the result if the data was replaced or cleared while the model was running
+        if self.app.initial_solution is None or self.app.initial_solution.data is not df:
+            return
+
+        if key is not None:
+            self._cluster_cache[key] = sol
+            while len(self._cluster_cache) > self.CACHE_SIZE:
+                self._cluster_cache.popitem(last=False)
+
+        hub_idxs = sol.hub_indices
 
         # 4) Apply the solution
         self.cmd.do(SetInitialSolutionCommand(self.app, sol))
 
         # 5) Update Info & Results panels
-        self.ui.txtInfoPanel.clear()
-        self.ui.txtInfoPanel.append(f"Clustering: {method.capitalize()}")
-        self.ui.txtInfoPanel.append(f"Clusters: {len(sol.cluster_labels)}")
-        self.ui.txtInfoPanel.append(f"Hubs: {hub_idxs}")
+        lines = [
+            f"Clustering: {method.capitalize()}",
+            f"Clusters: {len(sol.cluster_labels)}",
+            # Formatted by NumPy and shortened with "..." for many clusters
+            "Hubs: " + np.array2string(np.asarray(hub_idxs, dtype=np.intp), separator=', ',
+                                       threshold=50, max_line_width=120),
+        ]
+        self.ui.txtInfoPanel.setPlainText("\n".join(lines))
 
-        rez = ""
-        for lbl in sol.cluster_labels:
-            ids = np.where(sol.labels == lbl)[0].tolist()
-            rez += f"Cluster {lbl}: {ids}\n"
-        self.ui.txtResults.setPlainText(rez)
+        self.ui.txtResults.setPlainText(format_cluster_indices(sol.labels, sol.cluster_labels))
 
         # 6) Enable/Disable heuristic menus based on hubs
         if len(sol.hubs) == 0:
@@ -182,8 +298,6 @@ class ClusteringController:
                 "No Hubs",
                 "Geçerli hub bulunamadı; heuristic devredışı kalacak."
             )
-            self.ui.actionHillClimbing.setEnabled(False)
-            self.ui.actionSimulatedAnnealing.setEnabled(False)
+            self._set_heuristics_enabled(False)
         else:
-            self.ui.actionHillClimbing.setEnabled(True)
-            self.ui.actionSimulatedAnnealing.setEnabled(True)
+            self._set_heuristics_enabled(True)
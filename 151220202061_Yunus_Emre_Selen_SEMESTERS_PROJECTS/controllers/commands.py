@@ -1,7 +1,159 @@
 # controllers/commands.py
 
+import numpy as np
+from matplotlib.figure import Figure
+from PyQt5.QtCore import QEvent, QObject, QThreadPool
 from undo_redo import Command
-from utils import plot_solution
+from utils import draw_solution, plot_solution
+from .workers import Worker
+
+def _swap_figure(canvas, fig):
+    """
+    @brief Attaches a figure to a canvas in place of its current figure.
+
+    The new figure takes over the size and dpi of the figure currently shown, so a figure
+    rendered earlier fits the canvas even if the window was resized in the meantime.
+
+    @param canvas: The matplotlib canvas whose figure should be replaced.
+    @param fig: The figure to show on the canvas.
+    """
+    old = canvas.figure
+    if old is fig:
+        return
+    fig.set_dpi(old.dpi)
+    fig.set_size_inches(old.get_size_inches(), forward=False)
+    fig.set_canvas(canvas)
+    canvas.figure = fig
+
+def _freeze(sol):
+    """
+    @brief Marks the result arrays of a solution read-only once it is handed to the history.
+
+    The commands keep references to solutions rather than copies, which is only safe while a
+    solution is not changed after it was set; an in-place write to its labels or hubs then
+    raises instead of silently altering the undo history. The shared data array is read-only
+    already (see `Solution.X`).
+
+    @param sol: The `Solution` set by a command, or None.
+    """
+    if sol is None:
+        return
+    for arr in (sol.labels, sol.hubs):
+        if isinstance(arr, np.ndarray):
+            arr.flags.writeable = False
+
+def _build_figure(sol):
+    """
+    @brief Plots a solution into a new figure that is not attached to any on-screen canvas.
+
+    @param sol: The `Solution` object to plot.
+    @return: The new matplotlib Figure.
+    """
+    fig = Figure()
+    draw_solution(sol, fig)
+    return fig
+
+class _ShowWatcher(QObject):
+    """
+    @brief Event filter that renders the solution deferred for a canvas when the canvas is shown.
+    """
+
+    def eventFilter(self, obj, event):
+        """
+        @brief Shows the pending solution of the canvas on its Show event.
+
+        @param obj: The watched canvas.
+        @param event: The event sent to the canvas.
+        @return: False, so the event is still handled by the canvas itself.
+        """
+        if event.type() == QEvent.Show and getattr(obj, '_dirty', False):
+            show_solution(obj._dirty_sol, obj)
+        return False
+
+def save_figure(sol, size_inches, dpi, path):
+    """
+    @brief Plots a solution into a new figure and saves it to an image file.
+
+    The figure is private to the call, so this can run on a worker thread while the canvases
+    keep drawing their own figures.
+
+    @param sol: The `Solution` object to plot, or None for an empty figure.
+    @param size_inches: The figure size, taken from the canvas the solution is shown on.
+    @param dpi: The figure dpi, taken from the same canvas.
+    @param path: The path of the image file; the format follows its extension.
+    """
+    fig = Figure() if sol is None else _build_figure(sol)
+    fig.set_size_inches(size_inches)
+    # Fixed bounding box (no tight-bbox pass); JPEGs are written without the optimizing
+    # and progressive encoder passes
+    jpeg = path.lower().endswith(('.jpg', '.jpeg'))
+    fig.savefig(path, dpi=dpi, bbox_inches=None,
+                pil_kwargs={'optimize': False, 'progressive': False} if jpeg else None)
+
+def show_solution(sol, canvas):
+    """
+    @brief Shows a solution on a canvas, reusing the figure rendered for it earlier.
+
+    Each solution keeps the figure it was first plotted on. Showing the same solution again
+    (e.g. on undo/redo) only swaps that figure onto the canvas by reference. A solution that
+    has not been plotted yet is plotted on the thread pool and swapped in once it is ready, so
+    the UI thread is not blocked while the plot is built. Passing `None` shows an empty figure.
+
+    While the canvas is hidden nothing is plotted: the solution is remembered and shown when
+    the canvas becomes visible again.
+
+    @param sol: The `Solution` object to show, or None to clear the canvas.
+    @param canvas: The matplotlib canvas on which the solution should be shown.
+    """
+    # A newer request for the canvas supersedes any plot still being built for it
+    token = getattr(canvas, '_render_token', 0) + 1
+    canvas._render_token = token
+
+    if not canvas.isVisible():
+        # Defer until the canvas is shown again
+        canvas._dirty = True
+        canvas._dirty_sol = sol
+        if getattr(canvas, '_show_watcher', None) is None:
+            canvas._show_watcher = _ShowWatcher(canvas)
+            canvas.installEventFilter(canvas._show_watcher)
+        return
+    canvas._dirty = False
+    canvas._dirty_sol = None
+
+    if sol is None:
+        blank = getattr(canvas, '_blank_figure', None)
+        if blank is None:
+            blank = canvas._blank_figure = Figure()
+        _swap_figure(canvas, blank)
+        canvas.draw_idle()
+        return
+
+    fig = sol._figure
+    if fig is not None and fig.canvas is canvas:
+        _swap_figure(canvas, fig)
+        canvas.draw_idle()
+        return
+
+    def on_ready(fig):
+        # Keep the figure for later even if it is no longer the one to show
+        fig.set_canvas(canvas)
+        sol._figure = fig
+        if canvas._render_token == token:
+            _swap_figure(canvas, fig)
+            canvas.draw_idle()
+
+    def on_error(_):
+        # Plot on the UI thread instead, so the error surfaces as it would have before
+        if canvas._render_token == token:
+            fig = Figure()
+            _swap_figure(canvas, fig)
+            plot_solution(sol, canvas)
+            sol._figure = fig
+
+    worker = Worker(_build_figure, sol)
+    worker.signals.finished.connect(on_ready)
+    worker.signals.error.connect(on_error)
+    QThreadPool.globalInstance().start(worker)
 
 class LoadDataCommand(Command):
     """
@@ -11,6 +163,8 @@ class LoadDataCommand(Command):
     and sets it as the initial solution in the application. It also plots the solution.
     """
     
+    __slots__ = ('app', 'loader', 'path', 'prev', 'new')
+
     def __init__(self, app, loader, path):
         """
         @brief Initializes the LoadDataCommand.
@@ -31,13 +185,14 @@ class LoadDataCommand(Command):
 
         Loads the data from the specified file and creates a new `Solution` object.
         Sets this new solution as the initial solution and plots it on the initial canvas.
+        On redo the solution loaded the first time is reused, together with its rendered figure.
         """
-        df = self.loader.load_txt(self.path)
-        from models.solution import Solution
-        self.new = Solution(data=df)
+        if self.new is None:
+            ds = self.loader.load_or_cache(self.path)
+            from models.solution import Solution
+            self.new = Solution(data=ds.df, X=ds.xs, x_sq=ds.xs_sqnorm)
         self.app.initial_solution = self.new
-        plot_solution(self.new, self.app.canvasInitial)
-        self.app.canvasInitial.draw()
+        show_solution(self.new, self.app.canvasInitial)
 
     def undo(self):
         """
@@ -47,11 +202,7 @@ class LoadDataCommand(Command):
         If there is no previous solution, it clears the canvas.
         """
         self.app.initial_solution = self.prev
-        if self.prev:
-            plot_solution(self.prev, self.app.canvasInitial)
-        else:
-            self.app.canvasInitial.figure.clear()
-        self.app.canvasInitial.draw()
+        show_solution(self.prev, self.app.canvasInitial)
 
     def redo(self):
         """
@@ -69,6 +220,8 @@ class ClearInitialCommand(Command):
     This command clears the initial solution in the application and updates the canvas.
     """
     
+    __slots__ = ('app', 'prev')
+
     def __init__(self, app):
         """
         @brief Initializes the ClearInitialCommand.
@@ -78,6 +231,15 @@ class ClearInitialCommand(Command):
         self.app = app
         self.prev = app.initial_solution
 
+    def same_as(self, other):
+        """
+        @brief Two clear commands on the same application are equivalent.
+
+        @param other: The command to compare with.
+        @return: True if running `other` right after this command would change nothing.
+        """
+        return type(self) is type(other) and self.app is other.app
+
     def execute(self):
         """
         @brief Clears the initial solution and the initial canvas.
@@ -85,8 +247,7 @@ class ClearInitialCommand(Command):
         This method clears the initial solution and clears the canvas used for displaying the solution.
         """
         self.app.initial_solution = None
-        self.app.canvasInitial.figure.clear()
-        self.app.canvasInitial.draw()
+        show_solution(None, self.app.canvasInitial)
 
     def undo(self):
         """
@@ -96,8 +257,7 @@ class ClearInitialCommand(Command):
         """
         if self.prev:
             self.app.initial_solution = self.prev
-            plot_solution(self.prev, self.app.canvasInitial)
-            self.app.canvasInitial.draw()
+            show_solution(self.prev, self.app.canvasInitial)
 
     def redo(self):
         """
@@ -113,8 +273,12 @@ class SetInitialSolutionCommand(Command):
     @brief Command to set a new initial solution.
 
     This command sets the provided solution as the initial solution and updates the canvas.
+    The previous and new solutions are kept by reference: solutions are treated as immutable
+    once set, so undo and redo just swap references.
     """
     
+    __slots__ = ('app', 'new', 'prev')
+
     def __init__(self, app, sol):
         """
         @brief Initializes the SetInitialSolutionCommand.
@@ -125,6 +289,16 @@ class SetInitialSolutionCommand(Command):
         self.app = app
         self.new = sol
         self.prev = app.initial_solution
+        _freeze(sol)
+
+    def same_as(self, other):
+        """
+        @brief Two commands setting the same initial solution are equivalent.
+
+        @param other: The command to compare with.
+        @return: True if running `other` right after this command would change nothing.
+        """
+        return type(self) is type(other) and self.app is other.app and self.new is other.new
 
     def execute(self):
         """
@@ -132,12 +306,10 @@ class SetInitialSolutionCommand(Command):
 
         This method sets the new solution as the initial solution and plots it on the initial canvas.
         """
+        if self.app.initial_solution is self.new:
+            return  # Already shown, nothing to re-plot
         self.app.initial_solution = self.new
-        if self.new:
-            plot_solution(self.new, self.app.canvasInitial)
-        else:
-            self.app.canvasInitial.figure.clear()
-        self.app.canvasInitial.draw()
+        show_solution(self.new, self.app.canvasInitial)
 
     def undo(self):
         """
@@ -146,12 +318,10 @@ class SetInitialSolutionCommand(Command):
         Reverts to the previous initial solution and re-renders it on the canvas.
         If there is no previous solution, it clears the canvas.
         """
+        if self.app.initial_solution is self.prev:
+            return  # Already shown, nothing to re-plot
         self.app.initial_solution = self.prev
-        if self.prev:
-            plot_solution(self.prev, self.app.canvasInitial)
-        else:
-            self.app.canvasInitial.figure.clear()
-        self.app.canvasInitial.draw()
+        show_solution(self.prev, self.app.canvasInitial)
 
     def redo(self):
         """
@@ -167,8 +337,11 @@ class SetFinalSolutionCommand(Command):
     @brief Command to set a new final solution.
 
     This command sets the provided solution as the final solution and updates the canvas.
+    Like `SetInitialSolutionCommand`, it holds the solutions by reference only.
     """
     
+    __slots__ = ('app', 'new', 'prev')
+
     def __init__(self, app, sol):
         """
         @brief Initializes the SetFinalSolutionCommand.
@@ -179,6 +352,16 @@ class SetFinalSolutionCommand(Command):
         self.app = app
         self.new = sol
         self.prev = app.final_solution
+        _freeze(sol)
+
+    def same_as(self, other):
+        """
+        @brief Two commands setting the same final solution are equivalent.
+
+        @param other: The command to compare with.
+        @return: True if running `other` right after this command would change nothing.
+        """
+        return type(self) is type(other) and self.app is other.app and self.new is other.new
 
     def execute(self):
         """
@@ -186,12 +369,10 @@ class SetFinalSolutionCommand(Command):
 
         This method sets the new solution as the final solution and plots it on the final canvas.
         """
+        if self.app.final_solution is self.new:
+            return  # Already shown, nothing to re-plot
         self.app.final_solution = self.new
-        if self.new:
-            plot_solution(self.new, self.app.canvasFinal)
-        else:
-            self.app.canvasFinal.figure.clear()
-        self.app.canvasFinal.draw()
+        show_solution(self.new, self.app.canvasFinal)
 
     def undo(self):
         """
@@ -200,12 +381,10 @@ class SetFinalSolutionCommand(Command):
         Reverts to the previous final solution and re-renders it on the canvas.
         If there is no previous solution, it clears the canvas.
         """
+        if self.app.final_solution is self.prev:
+            return  # Already shown, nothing to re-plot
         self.app.final_solution = self.prev
-        if self.prev:
-            plot_solution(self.prev, self.app.canvasFinal)
-        else:
-            self.app.canvasFinal.figure.clear()
-        self.app.canvasFinal.draw()
+        show_solution(self.prev, self.app.canvasFinal)
 
     def redo(self):
         """
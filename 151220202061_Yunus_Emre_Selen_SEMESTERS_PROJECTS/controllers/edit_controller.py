@@ -1,32 +1,49 @@
 # controllers/edit_controller.py
 
-from abc import ABC, abstractmethod
+import collections
 
-class Command(ABC):
+class Command:
     """
-    @brief Abstract base class for all edit commands.
+    @brief Base class for all edit commands.
 
-    This abstract class defines the interface for all edit operations that will be implemented
+    This class defines the interface for all edit operations that will be implemented
     by concrete command classes. Each command must implement the `execute` and `undo` methods.
+    It is a plain class with empty `__slots__` (rather than an `abc.ABC`), so that concrete
+    commands can declare their own slots and carry no per-instance `__dict__`.
     """
-    
-    @abstractmethod
+
+    __slots__ = ()
+
     def execute(self):
         """
         @brief Executes the command.
 
         This method performs the operation associated with the command.
+
+        @throws NotImplementedError: If not implemented by the subclass.
         """
-        pass
+        raise NotImplementedError("Command execute() must be implemented.")
 
-    @abstractmethod
     def undo(self):
         """
         @brief Undoes the command.
 
         This method reverts the operation performed by `execute`.
+
+        @throws NotImplementedError: If not implemented by the subclass.
         """
-        pass
+        raise NotImplementedError("Command undo() must be implemented.")
+
+    def same_as(self, other):
+        """
+        @brief Tells whether `other` would repeat this command (see `execute`).
+
+        The default only matches the command itself; subclasses compare their targets.
+
+        @param other: The command to compare with.
+        @return: True if running `other` right after this command would change nothing.
+        """
+        return self is other
 
 class EditController:
     """
@@ -52,19 +69,23 @@ class EditController:
         self.init_mgr = init_mgr
         self.final_mgr = final_mgr
 
-        # Undo and redo stacks
-        self._undo_stack = []
-        self._redo_stack = []
+        # Undo and redo stacks, bounded so that the oldest commands (and whatever they
+        # reference) are dropped instead of being kept for the whole session
+        self._undo_stack = collections.deque(maxlen=64)
+        self._redo_stack = collections.deque(maxlen=64)
 
     def execute(self, cmd: Command):
         """
         @brief Executes a new edit command and adds it to the undo stack.
 
         This method runs the given command and clears the redo stack. It also updates the UI buttons 
-        to reflect the current undo/redo state.
+        to reflect the current undo/redo state. A command equal to the last one on the undo stack
+        (e.g. fired twice by a double click) is neither executed nor recorded again.
 
         @param cmd: The command to be executed.
         """
+        if self._undo_stack and self._undo_stack[-1].same_as(cmd):
+            return
         cmd.execute()
         self._undo_stack.append(cmd)
         self._redo_stack.clear()
@@ -130,6 +151,8 @@ class ClearInitialCommand(Command):
     This command clears the data in the initial manager and allows for undo/redo functionality.
     """
     
+    __slots__ = ('ctrl', 'prev_text')
+
     def __init__(self, controller: EditController):
         """
         @brief Initializes the ClearInitialCommand.
@@ -139,6 +162,15 @@ class ClearInitialCommand(Command):
         self.ctrl = controller
         self.prev_text = None
 
+    def same_as(self, other):
+        """
+        @brief Two clear commands on the same controller are equivalent.
+
+        @param other: The command to compare with.
+        @return: True if running `other` right after this command would change nothing.
+        """
+        return type(self) is type(other) and self.ctrl is other.ctrl
+
     def execute(self):
         """
         @brief Executes the clear command on the initial manager.
@@ -163,6 +195,8 @@ class ClearFinalCommand(Command):
     This command clears the data in the final manager and allows for undo/redo functionality.
     """
     
+    __slots__ = ('ctrl', 'prev_text')
+
     def __init__(self, controller: EditController):
         """
         @brief Initializes the ClearFinalCommand.
@@ -172,6 +206,15 @@ class ClearFinalCommand(Command):
         self.ctrl = controller
         self.prev_text = None
 
+    def same_as(self, other):
+        """
+        @brief Two clear commands on the same controller are equivalent.
+
+        @param other: The command to compare with.
+        @return: True if running `other` right after this command would change nothing.
+        """
+        return type(self) is type(other) and self.ctrl is other.ctrl
+
     def execute(self):
         """
         @brief Executes the clear command on the final manager.
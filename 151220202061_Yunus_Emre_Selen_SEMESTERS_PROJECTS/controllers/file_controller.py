@@ -2,12 +2,33 @@
 
 import os
 import re
+from collections import OrderedDict
 import numpy as np
-from PyQt5.QtWidgets import QFileDialog, QMessageBox, QInputDialog
-from .commands import LoadDataCommand, ClearInitialCommand, SetInitialSolutionCommand
-from utils import plot_solution, calculate_objective
+from PyQt5.QtCore import Qt, QThreadPool
+from PyQt5.QtWidgets import QApplication, QFileDialog, QMessageBox, QInputDialog
+from .commands import LoadDataCommand, ClearInitialCommand, SetInitialSolutionCommand, save_figure
+from .workers import Worker
+from utils import (calculate_objective, format_cluster_indices, nearest_hubs,
+                   write_solution, SAVE_FILE_FILTER)
 from models.solution import Solution
 
+# Separators of the hubs and nodes lists, and one "node:cluster" pair of the nodes list
+_SPLIT_RE = re.compile(r'[\s,;]+')
+_ASSIGN_RE = re.compile(r'(-?\d+):(-?\d+)')
+
+def _set_enabled(widgets, enabled):
+    """
+    @brief Sets the enabled state of several widgets or actions.
+
+    Widgets already in the requested state are skipped, so no change signal is emitted for them.
+
+    @param widgets: The widgets or actions to update.
+    @param enabled: The enabled state to set.
+    """
+    for w in widgets:
+        if w.isEnabled() != enabled:
+            w.setEnabled(enabled)
+
 class FileController:
     """
     @brief Manages file operations for loading, saving, exporting, and clearing data.
@@ -16,6 +37,9 @@ class FileController:
     initial solution, clearing the initial solution, and undo/redo functionality. It also 
     manages enabling and disabling UI elements based on the state of the application.
     """
+
+    # Number of initial solutions whose Results panel text is kept
+    RESULTS_CACHE_SIZE = 16
     
     def __init__(self, ui, loader, app, cmd_mgr):
         """
@@ -38,24 +62,40 @@ class FileController:
         ui.actionExit.triggered.connect(app.main_window.close)
         ui.btnExit.clicked.connect(app.main_window.close)
 
+        # Number of save/export jobs still running in the background
+        self._io_busy = 0
+
+        # Whether a manual run is computing in the background
+        self._manual_busy = False
+
+        # (has solution, can undo, can redo) the controls were last set for
+        self._last_state = None
+
+        # Results panel text of recent initial solutions: id -> (solution, text), oldest first
+        self._results_cache = OrderedDict()
+
         # Open Data actions
         ui.actionOpenData.triggered.connect(self.open_data)
         ui.btnOpenData.clicked.connect(self.open_data)
 
+        # Widgets toggled together, collected once
+        self._io_widgets = (ui.btnSaveInitial, ui.actionSaveInitial,
+                            ui.btnExportInitial, ui.actionExportInitial)
+        self._clear_widgets = (ui.btnClearInitial, ui.actionClearInitial)
+        self._undo_widgets = (ui.btnUndoInitial, ui.actionUndoInitial)
+        self._redo_widgets = (ui.btnRedoInitial, ui.actionRedoInitial)
+        self._menu_clustering_actions = tuple(ui.menuClustering.actions())
+        self._menu_heuristic_actions = tuple(ui.menuHeuristic.actions())
+
         # Disable initial controls at the start
-        for name in (
-            'btnSaveInitial','actionSaveInitial',
-            'btnExportInitial','actionExportInitial',
-            'btnClearInitial','actionClearInitial',
-            'btnUndoInitial','actionUndoInitial',
-            'btnRedoInitial','actionRedoInitial'
-        ):
-            getattr(ui, name).setEnabled(False)
+        for widgets in (self._io_widgets, self._clear_widgets,
+                        self._undo_widgets, self._redo_widgets):
+            _set_enabled(widgets, False)
         ui.btnRunManual.setEnabled(False)
 
         # Disable clustering and heuristic until data is loaded
-        for act in ui.menuClustering.actions(): act.setEnabled(False)
-        for act in ui.menuHeuristic.actions(): act.setEnabled(False)
+        _set_enabled(self._menu_clustering_actions, False)
+        _set_enabled(self._menu_heuristic_actions, False)
 
         # Bind initial handlers for saving, exporting, clearing, undo, and redo
         ui.btnSaveInitial.clicked.connect(self.save_initial)
@@ -84,7 +124,11 @@ class FileController:
         )
         if not path:
             return
-        self.cmd.do(LoadDataCommand(self.app, self.loader, path))
+        try:
+            self.cmd.do(LoadDataCommand(self.app, self.loader, path))
+        except ValueError as e:
+            QMessageBox.critical(self.app.main_window, "Load Error", str(e))
+            return
         # Enable initial controls and clustering menu
         self.update_controls()
 
@@ -92,36 +136,67 @@ class FileController:
         """
         @brief Saves the initial solution to a file.
 
-        This method prompts the user to choose a location to save the initial solution as a text file.
+        This method prompts the user to choose a location to save the initial solution as an NPZ,
+        Parquet or text file.
         """
         sol = self.app.initial_solution
         if not sol:
             return
         p, _ = QFileDialog.getSaveFileName(
-            self.app.main_window, "Save Initial As...", "", "Text Files (*.txt)"
+            self.app.main_window, "Save Initial As...", "", SAVE_FILE_FILTER
         )
         if p:
-            sol.data.to_csv(p, sep='\t', header=False, index=False)
+            self._start_io(write_solution, p, sol)
 
     def export_initial(self):
         """
         @brief Exports the initial solution to a specified file.
 
         This method allows the user to export the initial solution to various formats,
-        including text, JPEG, and PNG. The appropriate action is taken based on the file extension.
+        including NPZ, Parquet, text, JPEG, and PNG. The appropriate action is taken based on the file extension.
         """
         p, _ = QFileDialog.getSaveFileName(
             self.app.main_window,
             "Export Initial As...", "",
-            "Text Files (*.txt);;JPEG (*.jpg);;PNG (*.png)"
+            SAVE_FILE_FILTER + ";;JPEG (*.jpg);;PNG (*.png)"
         )
         if not p:
             return
         ext = os.path.splitext(p)[1].lower()
-        if ext == '.txt':
-            self.app.initial_solution.data.to_csv(p, sep='\t', header=False, index=False)
+        sol = self.app.initial_solution
+        if ext in ('.npz', '.parquet', '.txt'):
+            self._start_io(write_solution, p, sol)
         else:
-            self.app.canvasInitial.figure.savefig(p)
+            fig = self.app.canvasInitial.figure
+            self._start_io(save_figure, sol, fig.get_size_inches().copy(), fig.dpi, p)
+
+    def _start_io(self, fn, *args):
+        """
+        @brief Runs a save/export job on the thread pool.
+
+        The Save and Export controls stay disabled until the job ends, so the same file is not
+        written twice at once; an error raised by the job is shown in a message box.
+
+        @param fn: The function writing the file.
+        @param args: Positional arguments passed to `fn`.
+        """
+        self._io_busy += 1
+        self._update_io_controls()
+        worker = Worker(fn, *args)
+        worker.signals.finished.connect(lambda _: self._io_done(None))
+        worker.signals.error.connect(self._io_done)
+        QThreadPool.globalInstance().start(worker)
+
+    def _io_done(self, error):
+        """
+        @brief Re-enables the Save and Export controls after a save/export job.
+
+        @param error: The exception raised by the job, or None if it succeeded.
+        """
+        self._io_busy -= 1
+        self._update_io_controls()
+        if error is not None:
+            QMessageBox.critical(self.app.main_window, "Save Error", str(error))
 
     def clear_initial(self):
         """
@@ -137,119 +212,208 @@ class FileController:
         @brief Undoes the last action in the edit history.
 
         This method reverts the last executed command by invoking the undo method from the command manager.
+        Nothing is updated when there was no command to undo.
         """
-        self.cmd.undo()
-        self.update_controls()
+        if self.cmd.undo():
+            self._show_results()
+            self.update_controls()
 
     def on_redo(self):
         """
         @brief Redoes the last undone action in the edit history.
 
         This method re-applies the last undone command by invoking the redo method from the command manager.
+        Nothing is updated when there was no command to redo.
         """
-        self.cmd.redo()
-        self.update_controls()
+        if self.cmd.redo():
+            self._show_results()
+            self.update_controls()
+
+    def _results_text(self, sol):
+        """
+        @brief Returns the Results panel text of a solution, built once per solution.
+
+        The texts of the last `RESULTS_CACHE_SIZE` solutions shown are kept, so stepping back and
+        forth through the history does not scan their labels again.
+
+        @param sol: The solution with labels and cluster labels.
+        @return: The text listing the point indices of every cluster.
+        """
+        entry = self._results_cache.get(id(sol))
+        if entry is not None and entry[0] is sol:
+            self._results_cache.move_to_end(id(sol))
+            return entry[1]
+        text = format_cluster_indices(sol.labels, sol.cluster_labels)
+        self._results_cache[id(sol)] = (sol, text)
+        while len(self._results_cache) > self.RESULTS_CACHE_SIZE:
+            self._results_cache.popitem(last=False)
+        return text
+
+    def _show_results(self):
+        """
+        @brief Shows the clusters of the current initial solution in the Results panel, if it has any.
+        """
+        sol = self.app.initial_solution
+        if sol is not None and getattr(sol, 'labels', None) is not None:
+            self.ui.txtResults.setPlainText(self._results_text(sol))
 
     def update_controls(self):
         """
         @brief Updates the enabled state of UI controls based on the current state of the application.
 
         This method enables or disables the relevant buttons and menu items based on whether the initial solution 
-        is loaded, and the current undo/redo state.
+        is loaded, and the current undo/redo state. The controls owned by this controller are only
+        visited again when that state has changed since the last call.
         """
         has = self.app.initial_solution is not None
+        self._update_io_controls()
+        # Reset heuristic menu (also toggled by the clustering and heuristic controllers)
+        _set_enabled(self._menu_heuristic_actions, False)
+        can_u = self.cmd.pointer >= 0
+        can_r = self.cmd.pointer + 1 < len(self.cmd.history)
+        state = (has, can_u, can_r)
+        if state == self._last_state:
+            return
+        self._last_state = state
         # Enable/disable initial panel controls
-        for name in (
-            'btnSaveInitial','actionSaveInitial',
-            'btnExportInitial','actionExportInitial',
-            'btnClearInitial','actionClearInitial'
-        ):
-            getattr(self.ui, name).setEnabled(has)
+        _set_enabled(self._clear_widgets, has)
         # Enable/disable clustering menu items
-        for act in self.ui.menuClustering.actions():
-            act.setEnabled(has)
-        # Reset heuristic menu
-        for act in self.ui.menuHeuristic.actions():
-            act.setEnabled(False)
+        _set_enabled(self._menu_clustering_actions, has)
         # Enable/disable undo/redo buttons
-        can_u = self.cmd.pointer >= 0
-        can_r = self.cmd.pointer + 1 < len(self.cmd.history)
-        self.ui.btnUndoInitial.setEnabled(can_u)
-        self.ui.actionUndoInitial.setEnabled(can_u)
-        self.ui.btnRedoInitial.setEnabled(can_r)
-        self.ui.actionRedoInitial.setEnabled(can_r)
+        _set_enabled(self._undo_widgets, can_u)
+        _set_enabled(self._redo_widgets, can_r)
         # Enable/disable manual run button
-        self.ui.btnRunManual.setEnabled(has)
+        _set_enabled((self.ui.btnRunManual,), has and not self._manual_busy)
+
+    def _update_io_controls(self):
+        """
+        @brief Enables the Save and Export controls when there is a solution and no job is writing.
+        """
+        enabled = self.app.initial_solution is not None and not self._io_busy
+        _set_enabled(self._io_widgets, enabled)
 
     def run_manual(self):
         """
         @brief Runs the manual clustering process.
 
         This method allows the user to manually assign hubs and nodes to clusters. The solution is then calculated
-        and displayed on the UI with the corresponding objective value and clustering results.
+        and displayed on the UI with the corresponding objective value and clustering results. The input is
+        checked here; the solution is calculated on the thread pool (see `_manual_solution`) and applied
+        by `_on_manual_done`.
         """
+        if self._manual_busy:
+            return
         sol0 = self.app.initial_solution
         if sol0 is None:
             QMessageBox.warning(self.app.main_window, "Error", "No initial solution to run manual on.")
             return
-        data = sol0.data.values
+        X = sol0.xs
         # Get hubs input from the user
         hubs_txt = self.ui.leHubs.toPlainText()
         try:
-            hubs_idx = [int(x) for x in re.split(r'[\s,;]+', hubs_txt) if x.strip()]
+            hubs_idx = list(map(int, filter(None, _SPLIT_RE.split(hubs_txt))))
         except ValueError:
             QMessageBox.warning(self.app.main_window, "Error", "Invalid hubs list format.")
             return
-        if not hubs_idx or min(hubs_idx) < 0 or max(hubs_idx) >= data.shape[0]:
+        if not hubs_idx or min(hubs_idx) < 0 or max(hubs_idx) >= X.shape[0]:
             QMessageBox.warning(self.app.main_window, "Error", "Hub indices out of range.")
             return
         # Get manual node assignments from the user
         nodes_txt = self.ui.leNodes.toPlainText().strip()
         manual_assign = {}
         if nodes_txt:
-            try:
-                for part in re.split(r'[\s,;]+', nodes_txt):
-                    i, j = part.split(':')
-                    manual_assign[int(i)] = int(j)
-            except Exception:
+            matches = [_ASSIGN_RE.fullmatch(part) for part in _SPLIT_RE.split(nodes_txt)]
+            if not all(matches):
                 QMessageBox.warning(self.app.main_window, "Error", "Invalid nodes assignment format.")
                 return
+            manual_assign = {int(m[1]): int(m[2]) for m in matches}
+        # Nearest hubs and objective run on the thread pool: the first call of the compiled
+        # kernels compiles or loads them, which would block the window
+        self._manual_busy = True
+        _set_enabled((self.ui.btnRunManual,), False)
+        worker = Worker(self._manual_solution, sol0, hubs_idx, manual_assign)
+        worker.signals.finished.connect(
+            lambda res: self._on_manual_done(sol0.data, hubs_idx, manual_assign, res, None))
+        worker.signals.error.connect(
+            lambda e: self._on_manual_done(sol0.data, hubs_idx, manual_assign, None, e))
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        QThreadPool.globalInstance().start(worker)
+
+    @staticmethod
+    def _manual_solution(sol0, hubs_idx, manual_assign):
+        """
+        @brief Builds the manual solution (runs on the thread pool).
+
+        Every point joins its nearest hub, then the manual node assignments override that.
+
+        @param sol0: The current initial `Solution`, whose data is used.
+        @param hubs_idx: The indices of the hub points.
+        @param manual_assign: The manual assignments, node index -> cluster position.
+        @return: A tuple `(solution, skipped)` with the new `Solution` and the "node:cluster"
+            pairs that were ignored because they are out of range.
+        """
+        # Shared float32 array of the dataset; no conversion from the DataFrame per click
+        X = sol0.xs
         # Perform clustering by hubs
-        hubs = data[hubs_idx]
-        labels = np.argmin(np.linalg.norm(data[:, None, :] - hubs[None, :, :], axis=2), axis=1)
-        # Override manual assignments
-        for node_i, cl_i in manual_assign.items():
-            if 0 <= node_i < data.shape[0] and 0 <= cl_i < len(hubs_idx):
-                labels[node_i] = cl_i
+        hubs = X[hubs_idx]
+        # Nearest hub: compiled kernel when Numba is available, otherwise blocked matrix products
+        labels = nearest_hubs(X, hubs)
+        # Override manual assignments with one scatter; out-of-range pairs are skipped
+        skipped = []
+        if manual_assign:
+            keys = np.fromiter(manual_assign.keys(), dtype=np.int64, count=len(manual_assign))
+            vals = np.fromiter(manual_assign.values(), dtype=np.int64, count=len(manual_assign))
+            ok = (keys >= 0) & (keys < X.shape[0]) & (vals >= 0) & (vals < len(hubs_idx))
+            labels[keys[ok]] = vals[ok]
+            skipped = [f"{i}:{j}" for i, j in zip(keys[~ok].tolist(), vals[~ok].tolist())]
         cluster_labels = list(range(len(hubs_idx)))
         # Calculate objective value
-        obj = calculate_objective(data, labels, hubs, cluster_labels)
-        # Create and set the solution
-        sol = Solution(data=sol0.data)
+        obj = calculate_objective(X, labels, hubs, cluster_labels, x_sq=sol0.x_sq)
+        # Create the solution
+        sol = Solution(data=sol0.data, X=X, x_sq=sol0.x_sq)
         sol.labels = labels
         sol.cluster_labels = cluster_labels
         sol.hubs = hubs
         sol.hub_indices = hubs_idx
         sol.objective = obj
+        return sol, skipped
+
+    def _on_manual_done(self, df, hubs_idx, manual_assign, result, error):
+        """
+        @brief Applies a finished manual run and updates the UI.
+
+        @param df: The DataFrame the run was started on.
+        @param hubs_idx: The indices of the hub points.
+        @param manual_assign: The manual assignments, node index -> cluster position.
+        @param result: The `(solution, skipped)` tuple of `_manual_solution`, or None if the run failed.
+        @param error: The exception raised by the run, or None if it succeeded.
+        """
+        QApplication.restoreOverrideCursor()
+        self._manual_busy = False
+        _set_enabled((self.ui.btnRunManual,), self.app.initial_solution is not None)
+        if error is not None:
+            QMessageBox.critical(self.app.main_window, "Error", str(error))
+            return
+        # Drop the result if the data was replaced or cleared in the meantime
+        if self.app.initial_solution is None or self.app.initial_solution.data is not df:
+            return
+        sol, skipped = result
+        if skipped:
+            QMessageBox.warning(self.app.main_window, "Warning",
+                                f"Ignored out-of-range node assignments: {', '.join(skipped)}")
+        # Set the solution (the command also plots it)
         self.cmd.do(SetInitialSolutionCommand(self.app, sol))
-        # Plot the solution
-        plot_solution(sol, self.app.canvasInitial)
         # Update the info panel
         self.ui.txtInfoPanel.clear()
         self.ui.txtInfoPanel.append("Manual Solution")
         self.ui.txtInfoPanel.append(f"Hubs: {hubs_idx}")
         if manual_assign:
             self.ui.txtInfoPanel.append(f"Manual nodes: {manual_assign}")
-        self.ui.txtInfoPanel.append(f"Clusters: {len(cluster_labels)}")
-        self.ui.txtInfoPanel.append(f"Objective: {obj:.3f}")
+        self.ui.txtInfoPanel.append(f"Clusters: {len(sol.cluster_labels)}")
+        self.ui.txtInfoPanel.append(f"Objective: {sol.objective:.3f}")
         # Update the results panel
-        rez = ""
-        for lbl in cluster_labels:
-            idxs = np.where(labels == lbl)[0].tolist()
-            rez += f"Cluster {lbl}: {idxs}\n"
-        self.ui.txtResults.setPlainText(rez)
+        self.ui.txtResults.setPlainText(self._results_text(sol))
         # Enable heuristic menu
-        for act in self.ui.menuHeuristic.actions():
-            act.setEnabled(True)
+        _set_enabled(self._menu_heuristic_actions, True)
         # Update initial controls
         self.update_controls()
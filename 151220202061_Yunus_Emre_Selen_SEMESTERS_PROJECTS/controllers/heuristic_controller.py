@@ -1,9 +1,27 @@
 # controllers/heuristic_controller.py
 
 import os
-import numpy as np
-from PyQt5.QtWidgets import QMessageBox, QFileDialog
-from .commands import SetFinalSolutionCommand
+import threading
+from collections import OrderedDict
+from PyQt5.QtCore import Qt, QThreadPool
+from PyQt5.QtGui import QKeySequence
+from PyQt5.QtWidgets import QMessageBox, QFileDialog, QShortcut
+from .commands import SetFinalSolutionCommand, save_figure
+from .workers import Worker
+from utils import format_cluster_indices, write_solution, SAVE_FILE_FILTER
+
+def _set_enabled(widgets, enabled):
+    """
+    @brief Sets the enabled state of several widgets or actions.
+
+    Widgets already in the requested state are skipped, so no change signal is emitted for them.
+
+    @param widgets: The widgets or actions to update.
+    @param enabled: The enabled state to set.
+    """
+    for w in widgets:
+        if w.isEnabled() != enabled:
+            w.setEnabled(enabled)
 
 class HeuristicController:
     """
@@ -12,6 +30,9 @@ class HeuristicController:
     The `HeuristicController` class handles the execution of heuristic methods such as Hill Climbing and Simulated Annealing.
     It also manages the UI updates and final solution handling (save, export, undo, redo).
     """
+
+    # Number of final solutions whose Results panel text is kept
+    RESULTS_CACHE_SIZE = 16
     
     def __init__(self, ui, service, app, cmd_mgr):
         """
@@ -30,6 +51,26 @@ class HeuristicController:
         self.app = app
         self.cmd = cmd_mgr
 
+        # Number of save/export jobs still running in the background
+        self._io_busy = 0
+
+        # Cancel token of the heuristic run in progress
+        self._cancel_event = None
+
+        # (has solution, can undo, can redo) the controls were last set for
+        self._last_state = None
+
+        # Results panel text of recent final solutions: id -> (solution, text), oldest first
+        self._results_cache = OrderedDict()
+
+        # Widgets toggled together, collected once
+        self._io_widgets = (ui.btnSaveFinal, ui.actionSaveFinal,
+                            ui.btnExportFinal, ui.actionExportFinal)
+        self._clear_widgets = (ui.btnClearFinal, ui.actionClearFinal)
+        self._undo_widgets = (ui.btnUndoFinal, ui.actionUndoFinal)
+        self._redo_widgets = (ui.btnRedoFinal, ui.actionRedoFinal)
+        self._heuristic_actions = (ui.actionHillClimbing, ui.actionSimulatedAnnealing)
+
         # Initially disable heuristic menus
         self.ui.actionHillClimbing.setEnabled(False)
         self.ui.actionSimulatedAnnealing.setEnabled(False)
@@ -49,6 +90,10 @@ class HeuristicController:
             getattr(self.ui, btn_name).clicked.connect(fn)
             getattr(self.ui, act_name).triggered.connect(fn)
 
+        # Escape cancels a running heuristic
+        self._cancel_shortcut = QShortcut(QKeySequence(Qt.Key_Escape), app.main_window)
+        self._cancel_shortcut.activated.connect(self.cancel)
+
         # Initially, disable final panel controls
         self.update_final_controls()
 
@@ -56,8 +101,10 @@ class HeuristicController:
         """
         @brief Runs the selected heuristic method (Hill Climbing or Simulated Annealing).
 
-        This method applies the selected heuristic method to the current solution, performs the optimization,
-        and updates the final solution and UI.
+        This method starts the selected heuristic method on the current solution in the background and
+        returns immediately. The best objective found so far is shown in the info panel while it runs;
+        the final solution and UI are updated by `_on_heuristic_done` once it finishes. The heuristic
+        menu actions stay disabled during the run, and Escape cancels it.
 
         @param method: The heuristic method to be used, either 'hill' for Hill Climbing or 'annealing' for Simulated Annealing.
         """
@@ -67,13 +114,64 @@ class HeuristicController:
             QMessageBox.warning(self.app.main_window, "Error",
                                 "Heuristic cannot be applied: No valid clustering result available.")
             return
+        if self._cancel_event is not None:
+            return
+
+        # Run the heuristic method on the thread pool
+        title = "Hill Climbing" if method == 'hill' else "Simulated Annealing"
+        fn = self.svc.hill_climbing if method == 'hill' else self.svc.simulated_annealing
+        cancel = self._cancel_event = threading.Event()
+        worker = Worker(fn, base, cancel=cancel)
+        worker.kwargs['progress'] = worker.signals.progress.emit
+        worker.signals.progress.connect(lambda it, obj: self._on_progress(title, it, obj))
+        worker.signals.finished.connect(lambda sol: self._on_heuristic_done(title, cancel, sol, None))
+        worker.signals.error.connect(lambda e: self._on_heuristic_done(title, cancel, None, e))
+
+        _set_enabled(self._heuristic_actions, False)
+        self.ui.txtInfoPanel.setPlainText(f"Heuristic: {title} (running... press Esc to cancel)")
+        QThreadPool.globalInstance().start(worker)
+
+    def cancel(self):
+        """
+        @brief Cancels the heuristic run in progress, if any.
+
+        The service checks the cancel token before every iteration; the result of a cancelled run is discarded.
+        """
+        if self._cancel_event is not None:
+            self._cancel_event.set()
+
+    def _on_progress(self, title, iteration, best):
+        """
+        @brief Shows the progress of the running heuristic in the info panel.
+
+        @param title: The display name of the heuristic.
+        @param iteration: The number of iterations done so far.
+        @param best: The best objective found so far.
+        """
+        if self._cancel_event is None or self._cancel_event.is_set():
+            return
+        self.ui.txtInfoPanel.setPlainText(
+            f"Heuristic: {title} (running... press Esc to cancel)\n"
+            f"Iteration {iteration}: best objective {best:.6g}")
+
+    def _on_heuristic_done(self, title, cancel, sol, error):
+        """
+        @brief Applies a finished heuristic run and updates the UI.
+
+        @param title: The display name of the heuristic.
+        @param cancel: The cancel token of the run.
+        @param sol: The resulting `Solution`, or None if the run failed.
+        @param error: The exception raised by the run, or None if it succeeded.
+        """
+        self._cancel_event = None
+        base = self.app.initial_solution
+        _set_enabled(self._heuristic_actions, base is not None and getattr(base, 'hubs', None) is not None)
 
-        # Run the heuristic method
-        try:
-            sol = (self.svc.hill_climbing(base) if method == 'hill'
-                   else self.svc.simulated_annealing(base))
-        except Exception as e:
-            msg = str(e)
+        if cancel.is_set():
+            self.ui.txtInfoPanel.setPlainText(f"Heuristic: {title} (cancelled)")
+            return
+        if error is not None:
+            msg = str(error)
             QMessageBox.critical(self.app.main_window, "Heuristic Error", msg)
             self.ui.txtInfoPanel.clear()
             self.ui.txtInfoPanel.append(f"Error: {msg}")
@@ -83,15 +181,10 @@ class HeuristicController:
         self.cmd.do(SetFinalSolutionCommand(self.app, sol))
 
         # Update information panels
-        title = "Hill Climbing" if method == 'hill' else "Simulated Annealing"
         self.ui.txtInfoPanel.clear()
         self.ui.txtInfoPanel.append(f"Heuristic: {title}")
         self.ui.txtInfoPanel.append(f"Clusters: {len(sol.cluster_labels)}")
-        rez = ""
-        for lbl in sol.cluster_labels:
-            idxs = np.where(sol.labels == lbl)[0].tolist()
-            rez += f"Cluster {lbl}: {idxs}\n"
-        self.ui.txtResults.setPlainText(rez)
+        self.ui.txtResults.setPlainText(self._results_text(sol))
 
         # Update final controls
         self.update_final_controls()
@@ -100,34 +193,63 @@ class HeuristicController:
         """
         @brief Saves the final solution to a file.
 
-        This method allows the user to save the final solution to a file (as a text file).
+        This method allows the user to save the final solution to a file (as an NPZ, Parquet or text file).
         """
         sol = self.app.final_solution
         if sol:
             path, _ = QFileDialog.getSaveFileName(
-                self.app.main_window, "Save Final As...", "", "Text Files (*.txt)")
+                self.app.main_window, "Save Final As...", "", SAVE_FILE_FILTER)
             if path:
-                sol.data.to_csv(path, sep='\t', header=False, index=False)
+                self._start_io(write_solution, path, sol)
 
     def export(self):
         """
         @brief Exports the final solution to a specified file.
 
-        This method allows the user to export the final solution in various formats including text, JPEG, and PNG.
+        This method allows the user to export the final solution in various formats including NPZ, Parquet, text, JPEG, and PNG.
         The appropriate action is taken based on the selected file extension.
         """
         sol = self.app.final_solution
         if sol:
             path, _ = QFileDialog.getSaveFileName(
                 self.app.main_window, "Export Final As...", "",
-                "Text Files (*.txt);;JPEG (*.jpg);;PNG (*.png)"
+                SAVE_FILE_FILTER + ";;JPEG (*.jpg);;PNG (*.png)"
             )
             if path:
                 ext = os.path.splitext(path)[1].lower()
-                if ext == '.txt':
-                    sol.data.to_csv(path, sep='\t', header=False, index=False)
+                if ext in ('.npz', '.parquet', '.txt'):
+                    self._start_io(write_solution, path, sol)
                 else:
-                    self.app.canvasFinal.figure.savefig(path)
+                    fig = self.app.canvasFinal.figure
+                    self._start_io(save_figure, sol, fig.get_size_inches().copy(), fig.dpi, path)
+
+    def _start_io(self, fn, *args):
+        """
+        @brief Runs a save/export job on the thread pool.
+
+        The Save and Export controls stay disabled until the job ends, so the same file is not
+        written twice at once; an error raised by the job is shown in a message box.
+
+        @param fn: The function writing the file.
+        @param args: Positional arguments passed to `fn`.
+        """
+        self._io_busy += 1
+        self._update_io_controls()
+        worker = Worker(fn, *args)
+        worker.signals.finished.connect(lambda _: self._io_done(None))
+        worker.signals.error.connect(self._io_done)
+        QThreadPool.globalInstance().start(worker)
+
+    def _io_done(self, error):
+        """
+        @brief Re-enables the Save and Export controls after a save/export job.
+
+        @param error: The exception raised by the job, or None if it succeeded.
+        """
+        self._io_busy -= 1
+        self._update_io_controls()
+        if error is not None:
+            QMessageBox.critical(self.app.main_window, "Save Error", str(error))
 
     def clear(self):
         """
@@ -143,18 +265,50 @@ class HeuristicController:
         @brief Undoes the last action in the final solution history.
 
         This method undoes the last change made to the final solution and updates the UI.
+        Nothing is updated when there was no change to undo.
         """
-        self.cmd.undo()
-        self.update_final_controls()
+        if self.cmd.undo():
+            self._show_results()
+            self.update_final_controls()
 
     def redo(self):
         """
         @brief Redoes the last undone action in the final solution history.
 
         This method re-applies the last undone change to the final solution and updates the UI.
+        Nothing is updated when there was no change to redo.
         """
-        self.cmd.redo()
-        self.update_final_controls()
+        if self.cmd.redo():
+            self._show_results()
+            self.update_final_controls()
+
+    def _results_text(self, sol):
+        """
+        @brief Returns the Results panel text of a solution, built once per solution.
+
+        The texts of the last `RESULTS_CACHE_SIZE` solutions shown are kept, so stepping back and
+        forth through the history does not scan their labels again.
+
+        @param sol: The solution with labels and cluster labels.
+        @return: The text listing the point indices of every cluster.
+        """
+        entry = self._results_cache.get(id(sol))
+        if entry is not None and entry[0] is sol:
+            self._results_cache.move_to_end(id(sol))
+            return entry[1]
+        text = format_cluster_indices(sol.labels, sol.cluster_labels)
+        self._results_cache[id(sol)] = (sol, text)
+        while len(self._results_cache) > self.RESULTS_CACHE_SIZE:
+            self._results_cache.popitem(last=False)
+        return text
+
+    def _show_results(self):
+        """
+        @brief Shows the clusters of the current final solution in the Results panel, if it has any.
+        """
+        sol = self.app.final_solution
+        if sol is not None and getattr(sol, 'labels', None) is not None:
+            self.ui.txtResults.setPlainText(self._results_text(sol))
 
     def update_final_controls(self):
         """
@@ -162,17 +316,26 @@ class HeuristicController:
 
         This method enables or disables the UI controls related to the final solution based on whether a valid
         final solution exists. It also updates the undo/redo buttons based on the command history.
+        The clear and undo/redo controls are only visited again when that state has changed.
         """
         has = self.app.final_solution is not None and hasattr(self.app.final_solution, 'labels')
-        # Enable/disable save/export/clear controls only when a final solution exists
-        for name in ('btnSaveFinal', 'actionSaveFinal',
-                     'btnExportFinal', 'actionExportFinal',
-                     'btnClearFinal', 'actionClearFinal'):
-            getattr(self.ui, name).setEnabled(has)
-        # Enable/disable undo/redo buttons based on the command history
+        self._update_io_controls()
         can_undo = self.cmd.pointer >= 0
         can_redo = self.cmd.pointer + 1 < len(self.cmd.history)
-        self.ui.btnUndoFinal.setEnabled(can_undo)
-        self.ui.actionUndoFinal.setEnabled(can_undo)
-        self.ui.btnRedoFinal.setEnabled(can_redo)
-        self.ui.actionRedoFinal.setEnabled(can_redo)
+        state = (has, can_undo, can_redo)
+        if state == self._last_state:
+            return
+        self._last_state = state
+        # Enable/disable clear controls only when a final solution exists
+        _set_enabled(self._clear_widgets, has)
+        # Enable/disable undo/redo buttons based on the command history
+        _set_enabled(self._undo_widgets, can_undo)
+        _set_enabled(self._redo_widgets, can_redo)
+
+    def _update_io_controls(self):
+        """
+        @brief Enables the Save and Export controls when there is a final solution and no job is writing.
+        """
+        sol = self.app.final_solution
+        enabled = sol is not None and hasattr(sol, 'labels') and not self._io_busy
+        _set_enabled(self._io_widgets, enabled)
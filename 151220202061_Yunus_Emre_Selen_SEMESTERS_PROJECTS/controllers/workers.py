@@ -0,0 +1,51 @@
+# controllers/workers.py
+
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+class WorkerSignals(QObject):
+    """
+    @brief Signals emitted by a `Worker` while its job runs and when it ends.
+
+    The signals object lives in the thread that created the worker (the UI thread), so
+    connected callbacks run on the UI thread even though the job runs in the thread pool.
+    """
+
+    finished = pyqtSignal(object)
+    error = pyqtSignal(object)
+    # Optional progress report of long jobs: (step, value)
+    progress = pyqtSignal(int, float)
+
+
+class Worker(QRunnable):
+    """
+    @brief Runs a function in the background on a QThreadPool.
+
+    The return value of the function is emitted through `signals.finished`; an exception
+    raised by the function is emitted through `signals.error` instead of being lost in the
+    worker thread.
+    """
+
+    def __init__(self, fn, *args, **kwargs):
+        """
+        @brief Initializes the Worker.
+
+        @param fn: The function to run in the background.
+        @param args: Positional arguments passed to `fn`.
+        @param kwargs: Keyword arguments passed to `fn`.
+        """
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+
+    def run(self):
+        """
+        @brief Runs the function and emits its result or its exception.
+        """
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self.signals.error.emit(e)
+        else:
+            self.signals.finished.emit(result)
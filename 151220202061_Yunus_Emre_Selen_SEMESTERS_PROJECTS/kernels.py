@@ -0,0 +1,405 @@
+# File: kernels.py
+"""
+! @file kernels.py
+! @brief Optional Numba-compiled kernels for the numeric hot paths.
+
+Numba is not a hard dependency: when it cannot be imported `HAVE_NUMBA` is False and the
+callers in `utils` and `services.heuristic_service` keep using their NumPy implementations.
+"""
+
+import os
+import numpy as np
+
+try:
+    import numba
+    from numba import njit, prange
+except ImportError:
+    njit = None
+else:
+    # The kernels are launched from QThreadPool workers; a TBB pool started from such a
+    # thread keeps the interpreter from exiting, so prefer the (thread safe) OpenMP layer
+    if 'NUMBA_THREADING_LAYER_PRIORITY' not in os.environ:
+        numba.config.THREADING_LAYER_PRIORITY = ['omp', 'tbb', 'workqueue']
+
+HAVE_NUMBA = njit is not None
+
+# Largest cluster label for which a label -> hub lookup table is built
+_MAX_LABEL = 1 << 20
+
+if HAVE_NUMBA:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _objective_kernel(X, labels, slot, hubs):
+        """
+        @brief Sums the squared distances of the points to the hub of their cluster.
+
+        @param X: The data points, shape (n_points, n_features).
+        @param labels: The cluster label of each point.
+        @param slot: Lookup table from label to row of `hubs` (-1 for labels without a hub).
+        @param hubs: The hub coordinates, one row per cluster, as float64.
+        @return: The sum of squared distances (float).
+        """
+        n, d = X.shape
+        total = 0.0
+        for i in prange(n):
+            lbl = labels[i]
+            if lbl < 0 or lbl >= slot.shape[0]:
+                continue
+            k = slot[lbl]
+            if k < 0:
+                continue
+            acc = 0.0
+            for j in range(d):
+                diff = X[i, j] - hubs[k, j]
+                acc += diff * diff
+            total += acc
+        return total
+
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _assign_kernel(X, H, labels):
+        """
+        @brief Writes the index of the nearest hub of every point into `labels`.
+
+        @param X: The data points, shape (n_points, n_features).
+        @param H: The hub coordinates, shape (n_hubs, n_features).
+        @param labels: Output array of length n_points.
+        """
+        n, d = X.shape
+        k = H.shape[0]
+        for i in prange(n):
+            best = np.inf
+            best_j = 0
+            for j in range(k):
+                acc = 0.0
+                for c in range(d):
+                    diff = X[i, c] - H[j, c]
+                    acc += diff * diff
+                if acc < best:
+                    best = acc
+                    best_j = j
+            labels[i] = best_j
+
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _relocate_kernel(X, H, labels):
+        """
+        @brief Writes the index of the nearest hub of every point into `labels` and sums the distances.
+
+        @param X: The data points, shape (n_points, n_features).
+        @param H: The candidate hub coordinates, as float64.
+        @param labels: Output array of length n_points.
+        @return: The sum of squared distances of the points to their nearest hub (float).
+        """
+        n, d = X.shape
+        k = H.shape[0]
+        total = 0.0
+        for i in prange(n):
+            best = np.inf
+            best_j = 0
+            for j in range(k):
+                acc = 0.0
+                for c in range(d):
+                    diff = X[i, c] - H[j, c]
+                    acc += diff * diff
+                if acc < best:
+                    best = acc
+                    best_j = j
+            labels[i] = best_j
+            total += best
+        return total
+
+
+    @njit(cache=True, nogil=True)
+    def _accumulate(X, x_sq, labels, sums, counts, sq_sums):
+        """
+        @brief Recomputes the per-cluster point sums, counts and squared-norm sums of `labels`.
+        """
+        sums[:] = 0.0
+        counts[:] = 0
+        sq_sums[:] = 0.0
+        for i in range(X.shape[0]):
+            c = labels[i]
+            for j in range(X.shape[1]):
+                sums[c, j] += X[i, j]
+            counts[c] += 1
+            sq_sums[c] += x_sq[i]
+
+
+    @njit(cache=True, nogil=True)
+    def _move(X, x_sq, i, a, b, sums, counts, sq_sums):
+        """
+        @brief Moves point `i` from cluster `a` to cluster `b` in the per-cluster accumulators.
+        """
+        for j in range(X.shape[1]):
+            sums[a, j] -= X[i, j]
+            sums[b, j] += X[i, j]
+        counts[a] -= 1
+        counts[b] += 1
+        sq_sums[a] -= x_sq[i]
+        sq_sums[b] += x_sq[i]
+
+
+    @njit(cache=True, nogil=True)
+    def _mean_objective(sums, counts, sq_sums):
+        """
+        @brief Sum over the non-empty clusters of the squared distances of their points to their mean.
+        """
+        total = 0.0
+        for c in range(sums.shape[0]):
+            if counts[c] > 0:
+                s2 = 0.0
+                for j in range(sums.shape[1]):
+                    s2 += sums[c, j] * sums[c, j]
+                v = sq_sums[c] - s2 / counts[c]
+                if v > 0.0:
+                    total += v
+        return total
+
+
+    @njit(cache=True, nogil=True)
+    def _set_mean_hubs(sums, counts, hubs):
+        """
+        @brief Sets the hub of every non-empty cluster to the mean of its points.
+        """
+        for c in range(sums.shape[0]):
+            if counts[c] > 0:
+                for j in range(sums.shape[1]):
+                    hubs[c, j] = sums[c, j] / counts[c]
+
+
+    @njit(cache=True, nogil=True)
+    def _seed_kernel(seed):
+        """
+        @brief Seeds the random generator the compiled kernels draw from (one per thread).
+        """
+        np.random.seed(seed)
+
+
+    @njit(cache=True, nogil=True)
+    def _search_kernel(X, x_sq, labels, hubs, sums, counts, sq_sums, objective,
+                       best_labels, best_hubs, best_objective, cand,
+                       iterations, anneal, temp, cooling_rate, swap_batch):
+        """
+        @brief Runs hill climbing or simulated annealing iterations on the current state in place.
+
+        Each iteration draws one move (relocate hub, reallocate node, swap nodes) as in
+        `HeuristicService`; the move is applied to the arrays and undone if it is rejected.
+        With `swap_batch` > 1, a swap move picks the best of that many random pairs, like
+        `HeuristicService._best_swap`. As in the Python loop, a temperature of 0 (given, or
+        cooled down to it) accepts improvements only.
+
+        @return: The tuple (objective, best_objective, temp) after the iterations.
+        """
+        n = X.shape[0]
+        k = hubs.shape[0]
+        cand_hubs = np.empty_like(hubs)
+        for _ in range(iterations):
+            op = np.random.randint(0, 3)
+            if op == 0:
+                # Relocate a hub onto a random point; the candidate labels go to `cand`
+                h = np.random.randint(0, k)
+                p = np.random.randint(0, n)
+                cand_hubs[:, :] = hubs
+                cand_hubs[h, :] = X[p, :]
+                new_obj = _relocate_kernel(X, cand_hubs, cand)
+                delta = new_obj - objective
+                if delta < 0 or (anneal and temp > 0 and np.random.random() < np.exp(-delta / temp)):
+                    labels[:] = cand
+                    hubs[:, :] = cand_hubs
+                    _accumulate(X, x_sq, labels, sums, counts, sq_sums)
+                    objective = new_obj
+            elif op == 1:
+                # Reallocate a random node to another cluster
+                node = np.random.randint(0, n)
+                a = labels[node]
+                if k > 1:
+                    b = (a + 1 + np.random.randint(0, k - 1)) % k
+                    _move(X, x_sq, node, a, b, sums, counts, sq_sums)
+                    new_obj = _mean_objective(sums, counts, sq_sums)
+                    delta = new_obj - objective
+                    if delta < 0 or (anneal and temp > 0 and np.random.random() < np.exp(-delta / temp)):
+                        labels[node] = b
+                        _set_mean_hubs(sums, counts, hubs)
+                        objective = new_obj
+                    else:
+                        _move(X, x_sq, node, b, a, sums, counts, sq_sums)
+            else:
+                # Swap the clusters of two distinct random nodes
+                i = np.random.randint(0, n)
+                j = np.random.randint(0, n - 1)
+                if j >= i:
+                    j += 1
+                if swap_batch > 1:
+                    # Best pair of the batch by the change of the objective computed from the
+                    # accumulators; the first pair if no pair joins two different clusters
+                    best_delta = np.inf
+                    bi = i
+                    bj = j
+                    for t in range(swap_batch):
+                        if t > 0:
+                            i = np.random.randint(0, n)
+                            j = np.random.randint(0, n - 1)
+                            if j >= i:
+                                j += 1
+                        a = labels[i]
+                        b = labels[j]
+                        if a == b:
+                            continue
+                        sa_dx = 0.0
+                        sb_dx = 0.0
+                        dx_sq = 0.0
+                        for c in range(X.shape[1]):
+                            dx = X[j, c] - X[i, c]
+                            sa_dx += sums[a, c] * dx
+                            sb_dx += sums[b, c] * dx
+                            dx_sq += dx * dx
+                        d = -(2.0 * sa_dx + dx_sq) / counts[a] + (2.0 * sb_dx - dx_sq) / counts[b]
+                        if d < best_delta:
+                            best_delta = d
+                            bi = i
+                            bj = j
+                    i = bi
+                    j = bj
+                a = labels[i]
+                b = labels[j]
+                if a != b:
+                    _move(X, x_sq, i, a, b, sums, counts, sq_sums)
+                    _move(X, x_sq, j, b, a, sums, counts, sq_sums)
+                new_obj = _mean_objective(sums, counts, sq_sums)
+                delta = new_obj - objective
+                if delta < 0 or (anneal and temp > 0 and np.random.random() < np.exp(-delta / temp)):
+                    labels[i] = b
+                    labels[j] = a
+                    _set_mean_hubs(sums, counts, hubs)
+                    objective = new_obj
+                elif a != b:
+                    _move(X, x_sq, i, b, a, sums, counts, sq_sums)
+                    _move(X, x_sq, j, a, b, sums, counts, sq_sums)
+            if anneal:
+                if objective < best_objective:
+                    best_labels[:] = labels
+                    best_hubs[:, :] = hubs
+                    best_objective = objective
+                temp *= cooling_rate
+        return objective, best_objective, temp
+
+
+def assign_nearest(X, H):
+    """
+    @brief Assigns every point to its nearest hub with the compiled kernel.
+
+    The points are streamed once and only the running minimum of each row is kept, so no
+    (n_points, n_hubs) distance matrix is built.
+
+    @param X: The data points (2-D float array).
+    @param H: The hub coordinates, one row per hub.
+    @return: The index of the nearest hub of every point, or None if Numba is not available
+        or the input is not a 2-D float array.
+    """
+    if not HAVE_NUMBA or not isinstance(X, np.ndarray) or X.ndim != 2 or X.dtype.kind != 'f':
+        return None
+    H = np.ascontiguousarray(H, dtype=X.dtype).reshape(-1, X.shape[1])
+    labels = np.empty(X.shape[0], dtype=np.intp)
+    _assign_kernel(np.ascontiguousarray(X), H, labels)
+    return labels
+
+
+def objective(data, labels, hubs, cluster_labels):
+    """
+    @brief Computes the clustering objective with the compiled kernel.
+
+    @param data: The data points (numpy array).
+    @param labels: The labels of each data point indicating the assigned cluster.
+    @param hubs: The coordinates of the cluster hubs, in the order of `cluster_labels`.
+    @param cluster_labels: The unique cluster labels for the clustering result.
+    @return: The objective value (float), or None if the kernel cannot handle the input
+        (no Numba, non-numeric data, or labels that do not fit a lookup table).
+    """
+    if not HAVE_NUMBA or not isinstance(data, np.ndarray) or data.ndim != 2:
+        return None
+    labels = np.asarray(labels)
+    cl = np.asarray(cluster_labels)
+    if data.dtype.kind != 'f' or labels.dtype.kind not in 'iu' or cl.dtype.kind not in 'iu':
+        return None
+    if cl.size == 0:
+        return 0.0
+    if len(hubs) != cl.size:
+        return None
+    if cl.min() < 0 or cl.max() >= _MAX_LABEL:
+        return None
+
+    # 1) Lookup table from label to hub row
+    slot = np.full(int(cl.max()) + 1, -1, dtype=np.int64)
+    slot[cl] = np.arange(cl.size)
+
+    # 2) Sum the distances in parallel over the points
+    hubs = np.ascontiguousarray(hubs, dtype=np.float64).reshape(cl.size, data.shape[1])
+    return float(_objective_kernel(np.ascontiguousarray(data), labels.astype(np.int64, copy=False), slot, hubs))
+
+
+class LocalSearch:
+    """
+    @class LocalSearch
+    @brief State of a hill climbing or simulated annealing run of the compiled kernel.
+
+    Holds the current and the best solution as flat arrays (labels as hub positions 0..k-1,
+    float64 hubs, per-cluster accumulators); `run` advances the search in place, so a caller
+    can run it in slices and check for cancellation in between.
+    """
+
+    def __init__(self, X, x_sq, labels, hubs, sums, counts, sq_sums, objective,
+                 anneal=False, temp=1.0, cooling_rate=1.0, seed=0, swap_batch=1):
+        """
+        @brief Initializes the search state from a solution; the arrays are copied.
+
+        @param X: The data points, a 2-D float array.
+        @param x_sq: The squared norm of every point.
+        @param labels: The hub position (0..k-1) of every point.
+        @param hubs: The hub coordinates, one row per cluster.
+        @param sums: The per-cluster point sums of `labels`.
+        @param counts: The per-cluster point counts of `labels`.
+        @param sq_sums: The per-cluster sums of squared norms of `labels`.
+        @param objective: The objective of the solution.
+        @param anneal: True for simulated annealing, False for hill climbing.
+        @param temp: The initial temperature (annealing only).
+        @param cooling_rate: The factor the temperature is multiplied by after every iteration.
+        @param seed: Seed of the kernel's random generator.
+        @param swap_batch: The number of random pairs a swap move picks the best one from.
+        """
+        self.X = np.ascontiguousarray(X)
+        self.x_sq = np.ascontiguousarray(x_sq, dtype=np.float64)
+        self.labels = np.array(labels, dtype=np.intp)
+        self.hubs = np.array(hubs, dtype=np.float64).reshape(-1, self.X.shape[1])
+        self.sums = np.array(sums, dtype=np.float64)
+        self.counts = np.array(counts, dtype=np.int64)
+        self.sq_sums = np.array(sq_sums, dtype=np.float64)
+        self.objective = float(objective)
+        self.anneal = bool(anneal)
+        self.temp = float(temp)
+        self.cooling_rate = float(cooling_rate)
+        # Hill climbing only moves to better solutions, so its current solution is the best one
+        self.best_labels = self.labels.copy() if anneal else self.labels
+        self.best_hubs = self.hubs.copy() if anneal else self.hubs
+        self.best_objective = self.objective
+        self._cand = np.empty_like(self.labels)
+        self._seed = int(seed)
+        self.swap_batch = int(swap_batch)
+
+    def run(self, iterations):
+        """
+        @brief Runs the given number of iterations.
+
+        The kernel's random generator is per thread, so it is seeded on the first call from the
+        thread doing the run.
+
+        @param iterations: The number of iterations to run.
+        """
+        if self._seed is not None:
+            _seed_kernel(self._seed)
+            self._seed = None
+        self.objective, best, self.temp = _search_kernel(
+            self.X, self.x_sq, self.labels, self.hubs, self.sums, self.counts, self.sq_sums,
+            self.objective, self.best_labels, self.best_hubs, self.best_objective, self._cand,
+            int(iterations), self.anneal, self.temp, self.cooling_rate, self.swap_batch)
+        self.best_objective = self.objective if not self.anneal else best
@@ -2,22 +2,11 @@
 # nimnim
 
 import sys
-import matplotlib.pyplot as plt
 from PyQt5 import QtWidgets
 from PyQt5.QtWidgets import QVBoxLayout
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 
 from qt_design import Ui_MainWindow
-from models.data_loader import DataLoader
-from services.clustering_service import ClusteringService
-from services.heuristic_service import HeuristicService
 from undo_redo import CommandManager
-from controllers import (
-    FileController,
-    EditController,
-    ClusteringController,
-    HeuristicController
-)
 
 class Application:
     """
@@ -43,6 +32,25 @@ class Application:
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self.main_window)
 
+        # Paint the window before the numeric stack is imported; matplotlib, pandas and
+        # scikit-learn (pulled in by the models, services and controllers) take a while to load
+        self.main_window.show()
+        self.app.processEvents()
+
+        import matplotlib
+        matplotlib.use("Qt5Agg")  # Skip backend autodetection
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+        from matplotlib.figure import Figure
+        from models.data_loader import DataLoader
+        from services.clustering_service import ClusteringService
+        from services.heuristic_service import HeuristicService
+        from controllers import (
+            FileController,
+            EditController,
+            ClusteringController,
+            HeuristicController
+        )
+
         # Models & services
         self.data_loader = DataLoader()
         self.clustering_service = ClusteringService()
@@ -56,15 +64,18 @@ class Application:
         self.initial_solution = None
         self.final_solution   = None
 
-        # Embed matplotlib canvases
-        fig1 = plt.figure()
+        # Embed matplotlib canvases; plain Figures are not registered with pyplot (which would
+        # also give each one its own figure manager), and they double as the empty plot after a clear
+        fig1 = Figure()
         self.canvasInitial = FigureCanvas(fig1)
+        self.canvasInitial._blank_figure = fig1
         lay1 = QVBoxLayout(self.ui.plotInitial)
         lay1.setContentsMargins(0, 0, 0, 0)
         lay1.addWidget(self.canvasInitial)
 
-        fig2 = plt.figure()
+        fig2 = Figure()
         self.canvasFinal = FigureCanvas(fig2)
+        self.canvasFinal._blank_figure = fig2
         lay2 = QVBoxLayout(self.ui.plotFinal)
         lay2.setContentsMargins(0, 0, 0, 0)
         lay2.addWidget(self.canvasFinal)
@@ -87,8 +98,9 @@ class Application:
         """
         @brief Starts the PyQt5 application and displays the main window.
 
-        This method starts the PyQt5 event loop and shows the main application window. It waits for user interactions 
-        and handles application events until the user closes the window.
+        This method starts the PyQt5 event loop and shows the main application window (already shown by the
+        constructor, so this is a no-op then). It waits for user interactions and handles application events
+        until the user closes the window.
         """
         self.main_window.show()
         sys.exit(self.app.exec_())
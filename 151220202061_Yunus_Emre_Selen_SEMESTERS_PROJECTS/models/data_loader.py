@@ -1,8 +1,38 @@
 # File: models/data_loader.py
+import os
 import numpy as np
 import pandas as pd
 from typing import Any
 
+class LoadedDataset:
+    """
+    @class LoadedDataset
+    @brief A loaded dataset together with the arrays derived from it once.
+
+    Holds the DataFrame returned by `DataLoader.load_txt`, its contiguous float32 array and the
+    squared norm of every row, so the numeric code of the whole session can reuse them.
+    """
+
+    __slots__ = ('df', 'xs', 'xs_sqnorm')
+
+    def __init__(self, df, xs=None):
+        """
+        @brief Initializes the LoadedDataset and computes the derived arrays.
+
+        @param df: The loaded pandas DataFrame.
+        @param xs: Optional float32 array the DataFrame was built on; used as is instead of a copy.
+        """
+        self.df = df
+        if xs is None:
+            xs = np.ascontiguousarray(df.to_numpy(), dtype=np.float32)
+            if xs.base is not None:
+                xs = xs.copy()  # Keep the DataFrame buffer writable
+        xs.flags.writeable = False
+        self.xs = xs
+        self.xs_sqnorm = np.einsum('ij,ij->i', xs, xs, dtype=np.float64)
+        self.xs_sqnorm.flags.writeable = False
+
+
 class DataLoader:
     """
     @class DataLoader
@@ -18,18 +48,83 @@ class DataLoader:
         @brief Loads a .txt file containing numeric data into a DataFrame.
 
         This method reads a text file containing numeric data, parses the file into a pandas DataFrame, 
-        and validates that the data has at least two columns.
+        and validates that the data has at least two columns. The values are read as float32.
 
         @param file_path: The path to the `.txt` file containing numeric data.
         @return: A pandas DataFrame containing the loaded numeric data.
         @throws ValueError: If the data is invalid (less than two columns) or missing.
         """
+        return pd.DataFrame(self._read_array(file_path), copy=False)
+
+    def _read_array(self, file_path: str) -> np.ndarray:
+        """
+        @brief Reads a whitespace-separated numeric text file into a float32 array.
+
+        NumPy's C parser reads plain numeric files without building any intermediate objects;
+        files it cannot parse are retried with pandas' C tokenizer.
+
+        @param file_path: The path to the `.txt` file containing numeric data.
+        @return: A C-contiguous float32 array of shape (n_points, n_features).
+        @throws ValueError: If the data is invalid (less than two columns) or missing.
+        """
         try:
-            # Load the data using pandas read_csv, assuming space-separated values
-            df = pd.read_csv(file_path, sep="\s+", header=None)
-            if df.shape[1] < 2:
+            try:
+                arr = np.loadtxt(file_path, dtype=np.float32, ndmin=2)
+            except ValueError:
+                # Load the data using pandas read_csv, assuming space-separated values;
+                # the file is memory-mapped instead of being read into a buffer first
+                arr = pd.read_csv(file_path, sep="\s+", header=None, engine="c",
+                                  dtype=np.float32, memory_map=True).to_numpy()
+            if arr.ndim != 2 or arr.shape[1] < 2:
                 raise ValueError("Data must have at least two columns.")
-            return df
+            return np.ascontiguousarray(arr)
         except Exception as e:
             # If any error occurs while loading, raise an exception
             raise ValueError(f"Failed to load data: {e}")
+
+    def load_dataset(self, file_path: str) -> LoadedDataset:
+        """
+        @brief Loads a .txt file and precomputes the arrays used by the numeric code.
+
+        @param file_path: The path to the `.txt` file containing numeric data.
+        @return: A `LoadedDataset` with the DataFrame, its float32 array and its row norms.
+        @throws ValueError: If the data is invalid, missing, or not numeric.
+        """
+        arr = self._read_array(file_path)
+        return LoadedDataset(pd.DataFrame(arr, copy=False), xs=arr)
+
+    def load_or_cache(self, file_path: str) -> LoadedDataset:
+        """
+        @brief Loads a .txt file through a binary sidecar cache.
+
+        The first load parses the text file and writes its float32 array next to it as
+        `<file_path>.f32.npy`. Later loads memory-map that sidecar instead of parsing the text
+        again, so the OS pages the data in on demand. A sidecar older than the text file is
+        ignored and rewritten. If the sidecar cannot be written (e.g. a read-only folder), the
+        data is still returned.
+
+        @param file_path: The path to the `.txt` file containing numeric data.
+        @return: A `LoadedDataset` with the DataFrame, its float32 array and its row norms.
+        @throws ValueError: If the data is invalid, missing, or not numeric.
+        """
+        sidecar = file_path + ".f32.npy"
+        try:
+            if os.path.getmtime(sidecar) >= os.path.getmtime(file_path):
+                arr = np.load(sidecar, mmap_mode='r')
+                if arr.ndim == 2 and arr.shape[1] >= 2 and arr.dtype == np.float32:
+                    return LoadedDataset(pd.DataFrame(arr, copy=False), xs=arr)
+        except (OSError, ValueError):
+            pass  # Missing, stale or unreadable sidecar: parse the text file
+
+        arr = self._read_array(file_path)
+        tmp = sidecar + ".tmp"
+        try:
+            with open(tmp, 'wb') as f:
+                np.save(f, arr)
+            os.replace(tmp, sidecar)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+        return LoadedDataset(pd.DataFrame(arr, copy=False), xs=arr)
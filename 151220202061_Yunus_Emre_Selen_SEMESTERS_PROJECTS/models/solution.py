@@ -1,5 +1,4 @@
 import numpy as np
-from sklearn.cluster import KMeans, AffinityPropagation, MeanShift, SpectralClustering, AgglomerativeClustering, DBSCAN
 from models.data_loader import DataLoader
 import copy
 
@@ -12,16 +11,20 @@ class Solution:
     of solutions and can create deep copies of the solution for further analysis or improvements.
     """
 
-    def __init__(self, data=None):
+    def __init__(self, data=None, X=None, x_sq=None):
         """
         @brief Initializes the Solution object.
 
         This method initializes a `Solution` object to hold the data and results for clustering or heuristic algorithms.
 
         @param data: A pandas DataFrame containing the data to be used in clustering or heuristic operations.
+        @param X: Optional contiguous float32 array of `data`, shared from another solution on the same data.
+        @param x_sq: Optional squared row norms of `X`, shared the same way.
         """
         # Data and results
         self.data = data
+        self._X = X
+        self._x_sq = x_sq
 
         # Lists to store multiple solution stages if needed
         self.initial_solutions = []
@@ -33,6 +36,77 @@ class Solution:
         self.hubs = None
         self.objective = None
 
+        # Figure this solution was last rendered on (see controllers.commands.show_solution)
+        self._figure = None
+
+        # Per-cluster point sums, counts and squared-norm sums of the current labels
+        # (see services.heuristic_service.HeuristicService._accumulators)
+        self._sums = None
+        self._counts = None
+        self._sq_sums = None
+
+    @property
+    def X(self):
+        """
+        @brief The numeric data as a C-contiguous float32 array.
+
+        The array is built from `data` on first access and then reused; solutions created from
+        this one share it, so the numeric code never goes back through the DataFrame.
+
+        The array is read-only, since it is shared by every solution on the same dataset.
+
+        @return: A numpy array of shape (n_points, n_features), or None if there is no data.
+        """
+        if self._X is None and self.data is not None:
+            X = np.ascontiguousarray(np.asarray(self.data, dtype=np.float32))
+            if X.base is not None:
+                X = X.copy()  # Do not lock a buffer that is still owned by the DataFrame
+            X.flags.writeable = False
+            self._X = X
+        return self._X
+
+    @property
+    def xs(self):
+        """
+        @brief Alias of `X`, the shared C-contiguous float32 array of the dataset.
+
+        For a dataset opened through `DataLoader.load_dataset` this is the array the loader
+        parsed, so the whole session works on that one copy.
+
+        @return: A read-only numpy array of shape (n_points, n_features), or None if there is no data.
+        """
+        return self.X
+
+    @property
+    def x_sq(self):
+        """
+        @brief The squared norm of every row of `X`, as float64.
+
+        Computed once per dataset and shared like `X`; used to expand squared distances as
+        ||x||^2 - 2*x.h + ||h||^2.
+
+        @return: A numpy array of shape (n_points,), or None if there is no data.
+        """
+        if self._x_sq is None and self.X is not None:
+            X = self.X
+            x_sq = np.einsum('ij,ij->i', X, X, dtype=np.float64)
+            x_sq.flags.writeable = False
+            self._x_sq = x_sq
+        return self._x_sq
+
+    @property
+    def X_mv(self):
+        """
+        @brief A read-only memoryview of `X`.
+
+        Zero-copy handle for consumers that take any buffer-protocol object; `np.asarray` on
+        it gives back an array over the same memory without copying.
+
+        @return: A memoryview with the dtype and shape of `X`, or None if there is no data.
+        """
+        X = self.X
+        return None if X is None else memoryview(X)
+
     def copy(self):
         """
         @brief Creates a deep copy of the Solution object.
@@ -43,13 +117,38 @@ class Solution:
 
         @return: A new `Solution` object with the same data and results.
         """
-        new = Solution(data=self.data)
+        new = Solution(data=self.data, X=self._X, x_sq=self._x_sq)
         new.initial_solutions = list(self.initial_solutions)
         new.final_solutions = list(self.final_solutions)
         new.labels = None if self.labels is None else np.copy(self.labels)
         new.cluster_labels = None if self.cluster_labels is None else list(self.cluster_labels)
         new.hubs = None if self.hubs is None else np.copy(self.hubs)
         new.objective = self.objective
+        # Copied as well: the heuristic moves update them in place (only k rows, so this is cheap)
+        if self._sums is not None:
+            new._sums, new._counts, new._sq_sums = (np.copy(a) for a in (self._sums, self._counts, self._sq_sums))
+        return new
+
+    def _light_copy(self, results=True):
+        """
+        @brief Creates a copy of the Solution object for the heuristic search.
+
+        Unlike `copy`, the solution history lists and the cluster labels are shared with this
+        solution (the search never changes them) and the per-cluster accumulators are left out.
+        Only the labels and hubs, which the search changes in place, are copied.
+
+        @param results: If False, labels, hubs and objective are not copied either, for a caller
+            that sets its own result right away (see `set_result`).
+        @return: A new `Solution` object on the same data.
+        """
+        new = Solution(data=self.data, X=self._X, x_sq=self._x_sq)
+        new.initial_solutions = self.initial_solutions
+        new.final_solutions = self.final_solutions
+        new.cluster_labels = self.cluster_labels
+        if results:
+            new.labels = None if self.labels is None else np.copy(self.labels)
+            new.hubs = None if self.hubs is None else np.copy(self.hubs)
+            new.objective = self.objective
         return new
 
     def apply_clustering(self, data=None, method='kmeans', **params):
@@ -57,7 +156,8 @@ class Solution:
         @brief Applies a clustering algorithm to the data.
 
         This method applies a selected clustering method (e.g., KMeans, AffinityPropagation) to the provided data 
-        and stores the results as part of the solution. It also calculates the clustering objective.
+        and stores the results as part of the solution. The work is done by `ClusteringService.cluster`,
+        which also calculates the hubs and the clustering objective.
 
         @param data: The data to apply the clustering algorithm on (pandas DataFrame or numpy array).
         @param method: The clustering method to be used (e.g., 'kmeans', 'affinity', etc.).
@@ -65,35 +165,14 @@ class Solution:
         @return: The `Solution` object containing the clustering result.
         @throws ValueError: If an unknown clustering method is specified.
         """
-        X = data.values if hasattr(data, 'values') else (data if data is not None else self.data.values)
-
-        # Select the appropriate clustering algorithm
-        if method == 'kmeans':
-            model = KMeans(**params)
-        elif method == 'affinity':
-            model = AffinityPropagation(**params)
-        elif method == 'meanshift':
-            model = MeanShift(**params)
-        elif method == 'spectral':
-            model = SpectralClustering(**params)
-        elif method == 'hierarchical':
-            model = AgglomerativeClustering(**params)
-        elif method == 'dbscan':
-            model = DBSCAN(**params)
-        else:
-            raise ValueError(f"Unknown clustering method: {method}")
-
-        # Fit model and get results
-        labels = model.fit_predict(X)
-        hubs = getattr(model, 'cluster_centers_', None)
-        cluster_labels = np.unique(labels).tolist()
-        objective = None
-        if hubs is not None:
-            objective = np.sum((X - hubs[labels])**2)
+        # Imported here: the service module itself depends on `Solution`
+        from services.clustering_service import ClusteringService
 
-        # Create a new solution object and set the results
-        sol = Solution(data=self.data)
-        sol.set_result(labels, cluster_labels, hubs, objective)
+        # The service fits the model and computes the hubs and the objective
+        if data is None or hasattr(data, 'values'):
+            sol = ClusteringService().cluster(method, self.data if data is None else data, **params)
+        else:
+            sol = ClusteringService().cluster(method, self.data, X=np.asarray(data), **params)
 
         self.initial_solutions.append(sol)
         return sol
@@ -141,6 +220,7 @@ class Solution:
         self.cluster_labels = cluster_labels
         self.hubs = hubs
         self.objective = objective
+        self._sums = self._counts = self._sq_sums = None
 
     def _hill_climbing(self, sol, **params):
         """
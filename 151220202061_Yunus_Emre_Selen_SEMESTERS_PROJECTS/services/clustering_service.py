@@ -2,10 +2,19 @@ from sklearn.cluster import (
     KMeans, AffinityPropagation, MeanShift,
     SpectralClustering, AgglomerativeClustering, DBSCAN
 )
+import importlib.util
+import weakref
 import numpy as np
+from sklearn.neighbors import kneighbors_graph
 from models.solution import Solution
 from utils import calculate_objective, find_cluster_hub_nodes
 
+# flash1dkmeans is optional; it is only imported for KMeans on one-dimensional data
+HAVE_FLASH1DKMEANS = importlib.util.find_spec('flash1dkmeans') is not None
+
+# KMeans parameters the one-dimensional path understands (see `ClusteringService._kmeans_1d`)
+_KMEANS_1D_PARAMS = {'n_clusters', 'init', 'max_iter', 'n_init', 'algorithm', 'random_state'}
+
 
 class ClusteringService:
     """
@@ -16,7 +25,19 @@ class ClusteringService:
     (such as KMeans, DBSCAN, and others) and computes the hubs and objective value for the clustering result.
     """
 
-    def cluster(self, method: str, df, **params) -> Solution:
+    def __init__(self):
+        """
+        @brief Initializes the ClusteringService object.
+
+        The service keeps the nearest-neighbors affinity graph of the last dataset clustered with
+        spectral clustering, so re-running it on the same data (e.g. with another number of
+        clusters) does not rebuild the graph.
+        """
+        # (weak reference to the data array, its shape, n_neighbors, affinity matrix) of the last
+        # nearest-neighbors spectral run; dropped as soon as the array itself is freed
+        self._affinity_cache = None
+
+    def cluster(self, method: str, df, X=None, x_sq=None, cancel=None, out=None, **params) -> Solution:
         """
         @brief Applies a clustering algorithm and computes hubs and objective value.
 
@@ -25,21 +46,40 @@ class ClusteringService:
 
         @param method: The clustering algorithm method to be applied (e.g., 'kmeans', 'affinity', etc.).
         @param df: The input data (pandas DataFrame).
-        @param params: Additional parameters for the clustering algorithm.
+        @param X: Optional cached numeric array of `df` (or a buffer such as `Solution.X_mv`);
+            used instead of `df.values` when given.
+        @param x_sq: Optional precomputed squared norms of the rows of `X`.
+        @param cancel: Optional `threading.Event`; checked before and after fitting the model.
+        @param out: Optional dictionary of scratch buffers for the hub and objective calculation.
+        @param params: Additional parameters for the clustering algorithm. For KMeans, `n_init`
+            defaults to 1 (a single k-means++ initialisation) instead of scikit-learn's default; the
+            `algorithm` is left to the caller, since Lloyd's algorithm is faster than Elkan's on
+            the low-dimensional point sets used here.
         @return: A `Solution` object containing the clustering results, including labels, hubs, and objective.
         @throws ValueError: If an unknown clustering method is specified.
+        @throws RuntimeError: If the run was cancelled through `cancel`.
         """
-        # Extract data array from DataFrame
-        arr = df.values
+        # Extract data array from DataFrame unless the caller already has it
+        arr = df.values if X is None else np.asarray(X)
 
         # Initialize model based on selected method
+        hub_indices = None
+        fit_input = arr
         if method == 'kmeans':
-            model = KMeans(**params)
+            # One initialisation unless the caller asks for more
+            params.setdefault('n_init', 1)
+            # One-dimensional data is clustered on its sorted values when possible
+            model = None if self._supports_kmeans_1d(arr, params) else KMeans(**params)
         elif method == 'affinity':
             model = AffinityPropagation(**params)
         elif method == 'meanshift':
             model = MeanShift(**params)
         elif method == 'spectral':
+            if params.get('affinity') == 'nearest_neighbors':
+                # Reuse the affinity graph of the same data instead of letting the model rebuild it
+                fit_input = self._nearest_neighbors_affinity(arr, params.get('n_neighbors', 10),
+                                                             params.get('n_jobs'))
+                params = dict(params, affinity='precomputed')
             model = SpectralClustering(**params)
         elif method == 'hierarchical':
             model = AgglomerativeClustering(**params)
@@ -49,21 +89,126 @@ class ClusteringService:
             raise ValueError(f"Unknown clustering method: {method}")
 
         # Fit the model and predict labels
-        labels = model.fit_predict(arr)
-        # Filter out noise if DBSCAN is used (label -1 represents noise)
-        unique = [l for l in np.unique(labels) if l != -1]
+        if cancel is not None and cancel.is_set():
+            raise RuntimeError("Clustering was cancelled.")
+        if model is None:
+            labels, hub_indices = self._kmeans_1d(arr[:, 0], params)
+        else:
+            labels = model.fit_predict(fit_input)
+        if cancel is not None and cancel.is_set():
+            raise RuntimeError("Clustering was cancelled.")
+        # Filter out noise if DBSCAN is used (label -1 represents noise) and relabel the clusters
+        # to the dense range 0..k-1, so labels index the hubs and per-cluster arrays directly
+        unique = np.unique(labels)
+        unique = unique[unique != -1]
+        noise = labels == -1
+        labels = np.searchsorted(unique, labels)
+        labels[noise] = -1
+        unique = list(range(len(unique)))
 
         # Compute hubs: data points closest to cluster centroids
-        hubs, hub_indices = find_cluster_hub_nodes(arr, labels, unique)
+        if hub_indices is None:
+            hubs, hub_indices = find_cluster_hub_nodes(arr, labels, unique, x_sq=x_sq, out=out)
+        else:
+            hubs, hub_indices = arr[hub_indices], hub_indices.tolist()
 
         # Compute objective: sum of squared distances to hubs
-        objective = calculate_objective(arr, labels, hubs, unique)
+        objective = calculate_objective(arr, labels, hubs, unique, x_sq=x_sq, out=out)
 
         # Prepare Solution object to store clustering results
-        sol = Solution(data=df)
+        if not isinstance(X, np.ndarray):
+            X = x_sq = None
+        sol = Solution(data=df, X=X, x_sq=x_sq)
         sol.labels = labels
         sol.cluster_labels = unique
         sol.hubs = hubs
         sol.hub_indices = hub_indices
         sol.objective = objective
         return sol
+
+    def _nearest_neighbors_affinity(self, arr, n_neighbors, n_jobs=None):
+        """
+        @brief Returns the nearest-neighbors affinity matrix of the data for spectral clustering.
+
+        The matrix is built as scikit-learn's `SpectralClustering(affinity='nearest_neighbors')`
+        builds it (the symmetrized k-nearest-neighbors connectivity graph, including each point
+        itself) and is kept for the next call on the same data array. The cache only holds a weak
+        reference to the array, so loading another dataset frees the old array and its matrix.
+
+        @param arr: The data array.
+        @param n_neighbors: The number of neighbors of each point.
+        @param n_jobs: The number of parallel jobs for the neighbor search.
+        @return: The sparse affinity matrix of shape (n_points, n_points).
+        """
+        cached = self._affinity_cache
+        if (cached is not None and cached[0]() is arr and cached[1] == arr.shape
+                and cached[2] == n_neighbors):
+            return cached[3]
+        connectivity = kneighbors_graph(arr, n_neighbors=n_neighbors, include_self=True, n_jobs=n_jobs)
+        affinity = 0.5 * (connectivity + connectivity.T)
+        self._affinity_cache = (weakref.ref(arr, self._drop_affinity), arr.shape, n_neighbors, affinity)
+        return affinity
+
+    def _drop_affinity(self, ref):
+        """
+        @brief Forgets the cached affinity matrix once its data array has been freed.
+
+        @param ref: The dead weak reference to the data array.
+        """
+        cached = self._affinity_cache
+        if cached is not None and cached[0] is ref:
+            self._affinity_cache = None
+
+    @staticmethod
+    def _supports_kmeans_1d(arr, params):
+        """
+        @brief Checks whether a KMeans run can use the one-dimensional path (`_kmeans_1d`).
+
+        @param arr: The data array.
+        @param params: The KMeans parameters.
+        @return: True if flash1dkmeans is installed, the data has a single column and the
+            parameters are ones the one-dimensional path handles.
+        """
+        if not HAVE_FLASH1DKMEANS or arr.ndim != 2 or arr.shape[1] != 1:
+            return False
+        n_clusters = params.get('n_clusters', 8)
+        return (set(params) <= _KMEANS_1D_PARAMS and 2 <= n_clusters <= arr.shape[0]
+                and params.get('init', 'k-means++') == 'k-means++' and params['n_init'] == 1)
+
+    @staticmethod
+    def _kmeans_1d(values, params):
+        """
+        @brief Runs KMeans on one-dimensional data with `flash1dkmeans`.
+
+        The values are sorted once; on sorted data every cluster is a contiguous run, so
+        flash1dkmeans works on prefix sums and returns the run borders. The hub of a run is
+        then found by a binary search for the run's mean, instead of a pass over all points.
+
+        @param values: The one-dimensional data.
+        @param params: The KMeans parameters (`n_clusters`, `max_iter`, `random_state`).
+        @return: A tuple `(labels, hub_indices)` with the dense labels 0..k-1 of the non-empty
+            clusters and the index of the hub point of each of them.
+        """
+        from flash1dkmeans import kmeans_1d
+
+        # 1) Cluster the sorted values into contiguous runs
+        order = np.argsort(values, kind='stable')
+        sorted_values = values[order]
+        _, borders = kmeans_1d(sorted_values, params.get('n_clusters', 8),
+                               max_iter=params.get('max_iter', 300), is_sorted=True,
+                               return_cluster_borders=True, random_state=params.get('random_state'))
+        borders = np.unique(np.asarray(borders, dtype=np.intp))  # Drops empty runs
+        starts, stops = borders[:-1], borders[1:]
+
+        # 2) Labels in the original order
+        labels = np.empty(len(values), dtype=np.intp)
+        labels[order] = np.repeat(np.arange(len(starts)), stops - starts)
+
+        # 3) Hub of each run: the neighbour of the run mean's insertion position closest to the mean
+        prefix = np.concatenate(([0.0], np.cumsum(sorted_values, dtype=np.float64)))
+        means = (prefix[stops] - prefix[starts]) / (stops - starts)
+        pos = np.searchsorted(sorted_values, means)
+        lo = np.clip(pos - 1, starts, stops - 1)
+        hi = np.clip(pos, starts, stops - 1)
+        closer = np.abs(sorted_values[hi] - means) < np.abs(sorted_values[lo] - means)
+        return labels, order[np.where(closer, hi, lo)]
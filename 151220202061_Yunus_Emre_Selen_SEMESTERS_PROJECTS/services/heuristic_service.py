@@ -1,7 +1,9 @@
+import math
 import random
 import numpy as np
 from models.solution import Solution
-from utils import calculate_objective
+from utils import calculate_objective, cluster_positions, nearest_hubs
+import kernels
 
 class HeuristicService:
     """
@@ -21,144 +23,409 @@ class HeuristicService:
         """
         pass
 
-    def hill_climbing(self, init_sol: Solution, iterations: int = 1000) -> Solution:
+    # Iterations between two progress reports
+    PROGRESS_EVERY = 50
+
+    # Random swaps evaluated together by one swap move of hill climbing (see `_best_swap`)
+    SWAP_BATCH = 64
+
+    def hill_climbing(self, init_sol: Solution, iterations: int = 1000,
+                      cancel=None, progress=None) -> Solution:
         """
         @brief Performs Hill Climbing optimization on the initial solution.
 
         This method iteratively improves the solution by selecting random neighbors and accepting those with a 
-        better objective value. It runs for a fixed number of iterations.
+        better objective value. It runs for a fixed number of iterations, in the compiled kernel when Numba
+        is available (see `_run_compiled`).
 
         @param init_sol: The initial `Solution` object to be optimized.
         @param iterations: The number of iterations to perform (default is 1000).
+        @param cancel: Optional `threading.Event`; checked at least every `PROGRESS_EVERY` iterations.
+        @param progress: Optional callback `progress(iteration, best_objective)`, called every `PROGRESS_EVERY` iterations.
         @return: The best solution found after the specified number of iterations.
+        @throws RuntimeError: If the run was cancelled through `cancel`.
         """
-        best = init_sol.copy()
-        for _ in range(iterations):
-            neighbor = self._random_neighbor(best)
-            if neighbor.objective < best.objective:
-                best = neighbor
+        search = self._compiled_search(init_sol, anneal=False, swap_batch=self.SWAP_BATCH)
+        if search is not None:
+            return self._run_compiled(init_sol, search, iterations, cancel, progress)
+        # The neighbor is built in place on `best` and undone unless it is better
+        best = self._working_copy(init_sol)
+        ops = np.random.randint(0, 3, size=iterations)
+        for it in range(iterations):
+            self._check_cancel(cancel)
+            prev = best.objective
+            undo = self._random_neighbor(best, ops[it], swap_batch=self.SWAP_BATCH)
+            if not best.objective < prev:
+                self._undo_move(best, undo)
+            if progress is not None and (it + 1) % self.PROGRESS_EVERY == 0:
+                progress(it + 1, float(best.objective))
         return best
 
     def simulated_annealing(self, init_sol: Solution,
                              iterations: int = 1000,
                              initial_temp: float = 100.0,
-                             cooling_rate: float = 0.99) -> Solution:
+                             cooling_rate: float = 0.99,
+                             cancel=None, progress=None) -> Solution:
         """
         @brief Performs Simulated Annealing optimization on the initial solution.
 
         This method attempts to improve the solution by selecting random neighbors and accepting those that improve
         the objective function. In addition, it probabilistically accepts worse solutions with a certain probability
-        that decreases with temperature. The algorithm runs for a fixed number of iterations.
+        that decreases with temperature. The algorithm runs for a fixed number of iterations, in the compiled
+        kernel when Numba is available.
 
         @param init_sol: The initial `Solution` object to be optimized.
         @param iterations: The number of iterations to perform (default is 1000).
         @param initial_temp: The initial temperature for the annealing process (default is 100.0).
         @param cooling_rate: The rate at which the temperature cools down (default is 0.99).
+        @param cancel: Optional `threading.Event`; checked at least every `PROGRESS_EVERY` iterations.
+        @param progress: Optional callback `progress(iteration, best_objective)`, called every `PROGRESS_EVERY` iterations.
         @return: The best solution found after the specified number of iterations.
+        @throws RuntimeError: If the run was cancelled through `cancel`.
         """
-        current = init_sol.copy()
-        best = init_sol.copy()
-        temp = initial_temp
-        for _ in range(iterations):
-            neighbor = self._random_neighbor(current)
-            delta = neighbor.objective - current.objective
-            if delta < 0 or random.random() < np.exp(-delta / temp):
-                current = neighbor
+        search = self._compiled_search(init_sol, anneal=True, temp=initial_temp, cooling_rate=cooling_rate)
+        if search is not None:
+            return self._run_compiled(init_sol, search, iterations, cancel, progress)
+        # The neighbor is built in place on `current` and undone if it is rejected; `best` is
+        # a snapshot taken only when a new best solution is reached
+        current = self._working_copy(init_sol)
+        best = init_sol
+        ops = np.random.randint(0, 3, size=iterations)
+        # Temperature schedule and acceptance draws of the whole run, as Python floats
+        temps = (initial_temp * np.power(cooling_rate, np.arange(iterations, dtype=np.float64))).tolist()
+        rands = np.random.random(iterations).tolist()
+        for it in range(iterations):
+            self._check_cancel(cancel)
+            prev = current.objective
+            undo = self._random_neighbor(current, ops[it])
+            delta = current.objective - prev
+            temp = temps[it]
+            # A temperature that has cooled down to 0 accepts improvements only
+            if delta < 0 or (temp > 0 and rands[it] < math.exp(-delta / temp)):
                 if current.objective < best.objective:
-                    best = current
-            temp *= cooling_rate
+                    best = self._snapshot(current)
+            else:
+                self._undo_move(current, undo)
+            if progress is not None and (it + 1) % self.PROGRESS_EVERY == 0:
+                progress(it + 1, float(best.objective))
+        return best if best is not init_sol else init_sol.copy()
+
+    def _compiled_search(self, sol: Solution, anneal, temp=1.0, cooling_rate=1.0, swap_batch=1):
+        """
+        @brief Prepares a compiled search state (`kernels.LocalSearch`) for a solution.
+
+        @param sol: The initial `Solution`.
+        @param anneal: True for simulated annealing, False for hill climbing.
+        @param temp: The initial temperature (annealing only).
+        @param cooling_rate: The cooling rate (annealing only).
+        @param swap_batch: The number of random pairs a swap move picks the best one from.
+        @return: The search state, or None if Numba is not available or the solution does not fit
+            the kernel (fewer than two points, or points whose label has no hub).
+        """
+        if not kernels.HAVE_NUMBA or sol.X is None or len(sol.labels) < 2:
+            return None
+        pos = cluster_positions(sol.labels, sol.cluster_labels)
+        if (pos < 0).any() or len(sol.hubs) != len(sol.cluster_labels):
+            return None
+        sums, counts, sq_sums = self._accumulators(sol)
+        return kernels.LocalSearch(sol.X, sol.x_sq, pos, sol.hubs, sums, counts, sq_sums,
+                                   sol.objective, anneal=anneal, temp=temp,
+                                   cooling_rate=cooling_rate, seed=random.randrange(1 << 31),
+                                   swap_batch=swap_batch)
+
+    def _run_compiled(self, init_sol: Solution, search, iterations, cancel, progress) -> Solution:
+        """
+        @brief Runs a compiled search in slices of `PROGRESS_EVERY` iterations.
+
+        The moves and their acceptance are the same as in the Python loops, but they are applied to
+        flat arrays in place (and undone on rejection) instead of building a `Solution` per neighbor.
+        Between two slices the cancel token is checked and the progress is reported.
+
+        @param init_sol: The initial `Solution`.
+        @param search: The state returned by `_compiled_search`.
+        @param iterations: The number of iterations to perform.
+        @param cancel: Optional `threading.Event`.
+        @param progress: Optional progress callback.
+        @return: The best solution found.
+        @throws RuntimeError: If the run was cancelled through `cancel`.
+        """
+        done = 0
+        while done < iterations:
+            self._check_cancel(cancel)
+            step = min(self.PROGRESS_EVERY, iterations - done)
+            search.run(step)
+            done += step
+            if progress is not None and done % self.PROGRESS_EVERY == 0:
+                progress(done, float(search.best_objective))
+        best = init_sol._light_copy(results=False)
+        cluster_labels = np.asarray(init_sol.cluster_labels)
+        best.set_result(cluster_labels[search.best_labels], init_sol.cluster_labels,
+                        search.best_hubs.astype(np.asarray(init_sol.hubs).dtype), search.best_objective)
         return best
 
-    def _random_neighbor(self, sol: Solution) -> Solution:
+    @staticmethod
+    def _check_cancel(cancel):
+        """
+        @brief Stops a run whose cancel token has been set.
+
+        @param cancel: The `threading.Event` of the run, or None.
+        @throws RuntimeError: If `cancel` is set.
         """
-        @brief Selects a random neighbor solution.
+        if cancel is not None and cancel.is_set():
+            raise RuntimeError("Heuristic was cancelled.")
+
+    @staticmethod
+    def _working_copy(sol: Solution) -> Solution:
+        """
+        @brief Copies a solution for a search that changes it in place.
+
+        The working copy gets its own copy of the per-cluster accumulators, since the moves update
+        them in place.
+
+        @param sol: The initial `Solution`.
+        @return: A copy that owns its labels, hubs and accumulators.
+        """
+        work = sol._light_copy()
+        if sol._sums is not None:
+            work._sums, work._counts, work._sq_sums = (a.copy() for a in (sol._sums, sol._counts, sol._sq_sums))
+        return work
+
+    @staticmethod
+    def _snapshot(sol: Solution) -> Solution:
+        """
+        @brief Copies the labels, hubs and objective of a working solution.
+
+        @param sol: The working `Solution`.
+        @return: A copy that is not affected by later moves on `sol`.
+        """
+        return sol._light_copy()
+
+    def _random_neighbor(self, sol: Solution, op=None, swap_batch=1):
+        """
+        @brief Moves a solution to a random neighbor, in place.
 
         This method randomly selects a neighboring solution by applying one of the predefined neighbor 
-        generation operations (relocate hub, reallocate node, or swap nodes).
+        generation operations (relocate hub, reallocate node, or swap nodes) to `sol`. The search loops
+        draw the operations of the whole run up front and pass them in as `op`.
 
-        @param sol: The current `Solution` object to generate a neighbor from.
-        @return: A randomly selected neighbor solution.
+        @param sol: The current `Solution` object, changed in place.
+        @param op: Optional index of the operation (0: relocate hub, 1: reallocate node, 2: swap nodes);
+            drawn at random when omitted.
+        @param swap_batch: The number of random swaps the swap operation picks the best one from.
+        @return: The undo record of the move, for `_undo_move`.
         """
-        ops = [self._relocate_hub, self._reallocate_node, self._swap_nodes]
-        return random.choice(ops)(sol)
+        if op is None:
+            op = random.randrange(3)
+        if op == 0:
+            return self._relocate_hub(sol)
+        elif op == 1:
+            return self._reallocate_node(sol)
+        return self._swap_nodes(sol, swap_batch)
 
-    def _relocate_hub(self, sol: Solution) -> Solution:
+    def _undo_move(self, sol: Solution, undo):
+        """
+        @brief Reverts a move made by `_random_neighbor`.
+
+        @param sol: The `Solution` the move was applied to.
+        @param undo: The undo record returned by the move (None for a move that changed nothing).
+        """
+        if undo is None:
+            return
+        labels, hubs, objective, accumulators, moves = undo
+        if moves is None:
+            sol.labels = labels
+            sol._sums, sol._counts, sol._sq_sums = accumulators
+        else:
+            # Put the moved points back, last move first, in the labels and the accumulators
+            for i, old_label in reversed(moves):
+                new_label = sol.labels[i]
+                sol.labels[i] = old_label
+                self._move_point(sol, i, new_label, old_label, sol._sums, sol._counts, sol._sq_sums)
+        sol.hubs = hubs
+        sol.objective = objective
+
+    def _relocate_hub(self, sol: Solution):
         """
         @brief Relocates a hub to a random position.
 
         This method selects a random hub and replaces it with a randomly chosen data point. It then updates
-        the solution's labels and computes the new objective value.
+        the solution's labels and computes the new objective value. The nearest hubs are found by
+        `utils.nearest_hubs` (compiled kernel, or blocked matrix products of ||h||^2 - 2*x.h).
 
-        @param sol: The current `Solution` object to modify.
-        @return: The new `Solution` object after relocating the hub.
+        @param sol: The current `Solution` object to modify in place.
+        @return: The undo record of the move.
         """
-        neighbor = sol.copy()
-        labels = neighbor.labels.copy()
-        cluster_labels = neighbor.cluster_labels
-        hubs = neighbor.hubs.copy()
+        undo = (sol.labels, sol.hubs, sol.objective, (sol._sums, sol._counts, sol._sq_sums), None)
+        cluster_labels = sol.cluster_labels
+        hubs = sol.hubs.copy()
         # Select a random hub index and a random point to become new hub
         hub_idx = random.choice(range(len(hubs)))
-        point_idx = random.choice(range(len(neighbor.data)))
-        hubs[hub_idx] = neighbor.data.values[point_idx]
+        X = sol.X
+        point_idx = random.choice(range(len(X)))
+        hubs[hub_idx] = X[point_idx]
         # Reassign labels
-        dist = np.linalg.norm(neighbor.data.values[:, None, :] - hubs[None, :, :], axis=2)
-        labels = np.argmin(dist, axis=1)
-        neighbor.set_result(labels, cluster_labels, hubs,
-                            calculate_objective(neighbor.data.values, labels, hubs, cluster_labels))
-        return neighbor
+        labels = nearest_hubs(X, hubs)
+        sol.set_result(labels, cluster_labels, hubs,
+                       calculate_objective(X, labels, hubs, cluster_labels, x_sq=sol.x_sq))
+        return undo
 
-    def _reallocate_node(self, sol: Solution) -> Solution:
+    def _reallocate_node(self, sol: Solution):
         """
         @brief Moves a random node to a different cluster.
 
         This method selects a random node and moves it to another cluster. It then recomputes the hub positions
-        and updates the solution's labels and objective value.
+        and updates the solution's labels and objective value. Only the sums of the two clusters involved
+        change, so the hubs and the objective are derived from the per-cluster accumulators (see
+        `_accumulators`) in O(k*d) instead of another pass over all points.
 
-        @param sol: The current `Solution` object to modify.
-        @return: The new `Solution` object after reallocating the node.
+        @param sol: The current `Solution` object to modify in place.
+        @return: The undo record of the move, or None if there is no other cluster.
         """
-        neighbor = sol.copy()
-        labels = neighbor.labels.copy()
-        cluster_labels = neighbor.cluster_labels
-        hubs = neighbor.hubs.copy()
+        labels = sol.labels
+        cluster_labels = sol.cluster_labels
         # Move one random node to a different cluster
         node_idx = random.choice(range(len(labels)))
         current_cluster = labels[node_idx]
-        other_clusters = [c for c in cluster_labels if c != current_cluster]
-        if not other_clusters:
-            return neighbor
-        labels[node_idx] = random.choice(other_clusters)
-        # Recompute hubs as mean of assigned points
-        for i, cl in enumerate(cluster_labels):
-            points = neighbor.data.values[labels == cl]
-            if len(points) > 0:
-                hubs[i] = np.mean(points, axis=0)
-        neighbor.set_result(labels, cluster_labels, hubs,
-                            calculate_objective(neighbor.data.values, labels, hubs, cluster_labels))
-        return neighbor
-
-    def _swap_nodes(self, sol: Solution) -> Solution:
+        k = len(cluster_labels)
+        if k < 2:
+            return None
+        # Another cluster is an offset of 1..k-1 from the current position (noise joins any cluster)
+        pos = cluster_positions([current_cluster], cluster_labels)[0]
+        target = random.randrange(k) if pos < 0 else (pos + random.randrange(1, k)) % k
+        sums, counts, sq_sums = self._accumulators(sol)
+        undo = (None, sol.hubs, sol.objective, None, [(node_idx, current_cluster)])
+        labels[node_idx] = cluster_labels[target]
+        self._move_point(sol, node_idx, current_cluster, labels[node_idx], sums, counts, sq_sums)
+        self._set_mean_result(sol, labels, sums, counts, sq_sums)
+        return undo
+
+    def _swap_nodes(self, sol: Solution, batch=1):
         """
         @brief Swaps the clusters of two random nodes.
 
         This method randomly selects two nodes and swaps their clusters. It then recomputes the hub positions
-        and updates the solution's labels and objective value.
+        and updates the solution's labels and objective value, from the per-cluster accumulators like
+        `_reallocate_node`.
 
-        @param sol: The current `Solution` object to modify.
-        @return: The new `Solution` object after swapping the nodes.
+        @param sol: The current `Solution` object to modify in place.
+        @param batch: The number of random pairs to draw; the pair with the best objective is swapped
+            (see `_best_swap`). With 1, a single random pair is swapped.
+        @return: The undo record of the move.
         """
-        neighbor = sol.copy()
-        labels = neighbor.labels.copy()
-        cluster_labels = neighbor.cluster_labels
-        hubs = neighbor.hubs.copy()
+        labels = sol.labels
         # Swap clusters of two random nodes
-        i, j = random.sample(range(len(labels)), 2)
+        if batch > 1:
+            i, j = self._best_swap(sol, batch)
+        else:
+            i, j = random.sample(range(len(labels)), 2)
+        sums, counts, sq_sums = self._accumulators(sol)
+        undo = (None, sol.hubs, sol.objective, None, [(i, labels[i]), (j, labels[j])])
         labels[i], labels[j] = labels[j], labels[i]
-        # Recompute hubs
-        for idx, cl in enumerate(cluster_labels):
-            points = neighbor.data.values[labels == cl]
-            if len(points) > 0:
-                hubs[idx] = np.mean(points, axis=0)
-        neighbor.set_result(labels, cluster_labels, hubs,
-                            calculate_objective(neighbor.data.values, labels, hubs, cluster_labels))
-        return neighbor
+        self._move_point(sol, i, labels[j], labels[i], sums, counts, sq_sums)
+        self._move_point(sol, j, labels[i], labels[j], sums, counts, sq_sums)
+        self._set_mean_result(sol, labels, sums, counts, sq_sums)
+        return undo
+
+    def _best_swap(self, sol: Solution, batch):
+        """
+        @brief Draws a batch of random node pairs and returns the one whose swap lowers the objective most.
+
+        Swapping point i of cluster a with point j of cluster b leaves the counts unchanged and shifts
+        the sums by dx = x_j - x_i. The squared-norm sums of a and b change by ||x_j||^2 - ||x_i||^2
+        and by its negative, so their total cancels, and the change of the objective is
+        (||S_a||^2 - ||S_a + dx||^2) / n_a + (||S_b||^2 - ||S_b - dx||^2) / n_b. It is evaluated for
+        the whole batch at once from the per-cluster accumulators (see `_accumulators`). Pairs within
+        one cluster or with a point outside the clusters do not change the objective and are skipped.
+
+        @param sol: The current `Solution` object.
+        @param batch: The number of pairs to draw.
+        @return: The indices `(i, j)` of the chosen pair.
+        """
+        n = len(sol.labels)
+        i = np.random.randint(0, n, size=batch)
+        j = (i + np.random.randint(1, n, size=batch)) % n
+        a = cluster_positions(sol.labels[i], sol.cluster_labels)
+        b = cluster_positions(sol.labels[j], sol.cluster_labels)
+        useful = (a >= 0) & (b >= 0) & (a != b)
+        if not useful.any():
+            return int(i[0]), int(j[0])
+        i, j, a, b = i[useful], j[useful], a[useful], b[useful]
+
+        sums, counts, _ = self._accumulators(sol)
+        X = sol.X
+        dx = X[j].astype(np.float64) - X[i]
+        dx_sq = np.einsum('ij,ij->i', dx, dx)
+        delta = (-(2.0 * np.einsum('ij,ij->i', sums[a], dx) + dx_sq) / counts[a]
+                 + (2.0 * np.einsum('ij,ij->i', sums[b], dx) - dx_sq) / counts[b])
+        best = int(np.argmin(delta))
+        return int(i[best]), int(j[best])
+
+    def _accumulators(self, sol: Solution):
+        """
+        @brief Returns the per-cluster sums a solution's mean hubs and objective are derived from.
+
+        For every entry of `cluster_labels`: the sum of its points, their count and the sum of their
+        squared norms. With these, the mean of a cluster is `sum / count` and its sum of squared
+        distances to that mean is `sq_sum - ||sum||^2 / count`. They are computed in one pass over
+        the labels the first time and then carried along by `_reallocate_node` and `_swap_nodes`.
+
+        @param sol: The `Solution` with labels and cluster labels.
+        @return: A tuple `(sums, counts, sq_sums)` of shapes (k, d), (k,) and (k,).
+        """
+        if sol._sums is None:
+            X, x_sq = sol.X, sol.x_sq
+            k = len(sol.cluster_labels)
+            idx = cluster_positions(sol.labels, sol.cluster_labels)
+            valid = idx >= 0
+            idx, X, x_sq = idx[valid], X[valid], x_sq[valid]
+            sol._sums = np.stack([np.bincount(idx, weights=X[:, c], minlength=k)
+                                  for c in range(X.shape[1])], axis=1)
+            sol._counts = np.bincount(idx, minlength=k)
+            sol._sq_sums = np.bincount(idx, weights=x_sq, minlength=k)
+        return sol._sums, sol._counts, sol._sq_sums
+
+    def _move_point(self, sol, i, old_label, new_label, sums, counts, sq_sums):
+        """
+        @brief Moves one point between two clusters in the per-cluster accumulators.
+
+        @param sol: The `Solution` holding the data.
+        @param i: The index of the point.
+        @param old_label: The label of the cluster the point leaves.
+        @param new_label: The label of the cluster the point joins.
+        @param sums: The per-cluster point sums, updated in place.
+        @param counts: The per-cluster point counts, updated in place.
+        @param sq_sums: The per-cluster sums of squared norms, updated in place.
+        """
+        a, b = cluster_positions([old_label, new_label], sol.cluster_labels)
+        if a == b:
+            return
+        x, x_sq = sol.X[i], sol.x_sq[i]
+        if a >= 0:
+            sums[a] -= x
+            counts[a] -= 1
+            sq_sums[a] -= x_sq
+        if b >= 0:
+            sums[b] += x
+            counts[b] += 1
+            sq_sums[b] += x_sq
+
+    @staticmethod
+    def _set_mean_result(sol, labels, sums, counts, sq_sums):
+        """
+        @brief Sets labels, mean hubs and objective of a solution from its per-cluster accumulators.
+
+        The hub of every non-empty cluster becomes the mean of its points; an empty cluster keeps its hub
+        and adds nothing to the objective.
+
+        @param sol: The `Solution` to update.
+        @param labels: The new labels.
+        @param sums: The per-cluster point sums.
+        @param counts: The per-cluster point counts.
+        @param sq_sums: The per-cluster sums of squared norms.
+        """
+        hubs = np.array(sol.hubs, copy=True)
+        filled = counts > 0
+        hubs[filled] = sums[filled] / counts[filled, None]
+        sse = sq_sums[filled] - np.einsum('ij,ij->i', sums[filled], sums[filled]) / counts[filled]
+        sol.set_result(labels, sol.cluster_labels, hubs, float(np.maximum(sse, 0.0).sum()))
+        sol._sums, sol._counts, sol._sq_sums = sums, counts, sq_sums
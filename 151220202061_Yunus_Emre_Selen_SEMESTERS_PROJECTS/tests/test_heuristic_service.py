@@ -0,0 +1,40 @@
+# tests/test_heuristic_service.py
+
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+import kernels
+from services.clustering_service import ClusteringService
+from services.heuristic_service import HeuristicService
+
+
+class SimulatedAnnealingZeroTemperatureTest(unittest.TestCase):
+    """
+    @brief Simulated annealing with a temperature of 0 accepts improvements only, on both paths.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame(rng.normal(size=(300, 2)))
+        X = np.ascontiguousarray(df.values, dtype=np.float32)
+        self.sol = ClusteringService().cluster('kmeans', df, X=X, n_clusters=4, random_state=0)
+        self.svc = HeuristicService()
+
+    def _check(self):
+        for params in ({'initial_temp': 0.0}, {'initial_temp': 100.0, 'cooling_rate': 0.0}):
+            result = self.svc.simulated_annealing(self.sol, iterations=200, **params)
+            self.assertTrue(np.isfinite(result.objective))
+            self.assertLessEqual(result.objective, self.sol.objective + 1e-6)
+
+    @unittest.skipUnless(kernels.HAVE_NUMBA, "Numba is not installed")
+    def test_compiled(self):
+        self._check()
+
+    def test_python(self):
+        with mock.patch.object(kernels, 'HAVE_NUMBA', False):
+            self._check()
+
+
+if __name__ == '__main__':
+    unittest.main()
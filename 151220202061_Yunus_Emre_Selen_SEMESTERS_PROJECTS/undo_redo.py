@@ -12,8 +12,11 @@ class Command:
 
     This is an abstract class that defines the interface for all undoable and redoable commands. 
     Each specific command class must implement the `execute()` and `undo()` methods.
+    The empty `__slots__` lets subclasses declare their own slots and skip the per-instance `__dict__`.
     """
 
+    __slots__ = ()
+
     def execute(self):
         """
         ! @brief Executes the command.
@@ -36,6 +39,19 @@ class Command:
         """
         raise NotImplementedError("Command undo() must be implemented.")
 
+    def same_as(self, other):
+        """
+        ! @brief Tells whether `other` would repeat this command.
+
+        Used to skip a command that duplicates the last one recorded. It is a named method
+        rather than `__eq__`, so commands keep the default identity equality and hashing.
+        Subclasses compare their targets; the default only matches the command itself.
+
+        @param other: The command to compare with.
+        @return: True if running `other` right after this command would change nothing.
+        """
+        return self is other
+
 
 class CommandManager:
     """
@@ -46,28 +62,42 @@ class CommandManager:
     undo/redo functionality. It maintains the history of commands and allows users to undo or redo actions.
     """
 
-    def __init__(self):
+    def __init__(self, max_history=32):
         """
         ! @brief Initializes the CommandManager instance.
 
         The constructor initializes an empty history stack and sets the pointer to -1.
+
+        @param max_history: The maximum number of commands kept; older ones are dropped first.
         """
         self.history = []  # type: list[Command]
         self.pointer = -1
+        self.max_history = max_history
 
     def do(self, command: Command):
         """
         ! @brief Execute a new command and record it.
 
         This method executes a new command and stores it in the history stack. The history is trimmed 
-        to remove any redoable commands that follow the current pointer.
+        to remove any redoable commands that follow the current pointer. A command equal to the
+        current one (see `Command.same_as`) is skipped, so repeated signals add no history.
+        Beyond `max_history` commands the oldest ones are dropped, together with the solutions
+        (and rendered figures) that only they still reference.
 
         @param command: The command to be executed.
         """
+        if self.pointer >= 0 and self.history[self.pointer].same_as(command):
+            return
         command.execute()
-        self.history = self.history[:self.pointer + 1]
+        # Drop the redoable commands in place; nothing to do when the pointer is at the end
+        if self.pointer + 1 < len(self.history):
+            del self.history[self.pointer + 1:]
         self.history.append(command)
         self.pointer += 1
+        excess = len(self.history) - self.max_history
+        if excess > 0:
+            del self.history[:excess]
+            self.pointer -= excess
 
     def undo(self):
         """
@@ -76,12 +106,14 @@ class CommandManager:
         This method undoes the last executed command and moves the pointer backward in the history stack. 
         If no command is available to undo, nothing happens.
 
-        @throws IndexError: If no command is available to undo.
+        @return: True if a command was undone, False if there was nothing to undo.
         """
-        if self.pointer >= 0:
-            cmd = self.history[self.pointer]
-            cmd.undo()
-            self.pointer -= 1
+        if self.pointer < 0:
+            return False
+        cmd = self.history[self.pointer]
+        cmd.undo()
+        self.pointer -= 1
+        return True
 
     def redo(self):
         """
@@ -90,9 +122,11 @@ class CommandManager:
         This method re-executes the next undone command and moves the pointer forward in the history stack.
         If no command is available to redo, nothing happens.
 
-        @throws IndexError: If no command is available to redo.
+        @return: True if a command was redone, False if there was nothing to redo.
         """
-        if self.pointer + 1 < len(self.history):
-            self.pointer += 1
-            cmd = self.history[self.pointer]
-            cmd.execute()
+        if self.pointer + 1 >= len(self.history):
+            return False
+        self.pointer += 1
+        cmd = self.history[self.pointer]
+        cmd.execute()
+        return True
@@ -1,7 +1,31 @@
+import os
+import importlib.util
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.colors import to_rgba_array
+from matplotlib.lines import Line2D
+import kernels
 
-def calculate_objective(data, labels, hubs, cluster_labels):
+def _scratch(out, key, shape, dtype):
+    """
+    @brief Returns a scratch array of the given shape from a dictionary of reusable buffers.
+
+    Each buffer only grows: a request that fits into the buffer kept under `key` gets a view
+    of it, so repeated calls of the same size do not allocate at all.
+
+    @param out: The dictionary holding the buffers between calls.
+    @param key: The name of the buffer.
+    @param shape: The shape of the requested array.
+    @param dtype: The dtype of the requested array.
+    @return: An uninitialized array of the requested shape backed by the buffer.
+    """
+    size = int(np.prod(shape))
+    buf = out.get(key)
+    if buf is None or buf.dtype != dtype or buf.size < size:
+        buf = out[key] = np.empty(size, dtype=dtype)
+    return buf[:size].reshape(shape)
+
+def calculate_objective(data, labels, hubs, cluster_labels, x_sq=None, out=None):
     """
     @brief Calculates the objective value for a clustering solution.
 
@@ -9,45 +33,272 @@ def calculate_objective(data, labels, hubs, cluster_labels):
     between the data points and their respective hubs (cluster centers). The objective is used
     to evaluate the quality of a clustering solution.
 
-    @param data: The data points (numpy array).
+    @param data: The data points (numpy array or any buffer-protocol object, e.g. `Solution.X_mv`).
     @param labels: The labels of each data point indicating the assigned cluster.
     @param hubs: The coordinates of the cluster hubs (centroids).
     @param cluster_labels: The unique cluster labels for the clustering result.
+    @param x_sq: Optional precomputed squared norms of the data rows. When given, the
+        distances are expanded as ||x||^2 - 2*x.h + ||h||^2 instead of being recomputed.
+    @param out: Optional dictionary of scratch buffers reused between calls (see `_scratch`).
     @return: The objective value (float), which is the sum of squared distances to the hubs.
     """
-    total = 0.0
-    for lbl, hub in zip(cluster_labels, hubs):
-        mask = (labels == lbl)
-        total += np.sum((data[mask] - hub)**2)
-    return float(total)
+    data = np.asarray(data)
+
+    # Compiled kernel when Numba is available (see kernels.py)
+    fast = kernels.objective(data, labels, hubs, cluster_labels)
+    if fast is not None:
+        return fast
+
+    # 1) Hub row of every point, in one pass (points of other labels, e.g. noise, are skipped)
+    k = len(cluster_labels)
+    if k == 0:
+        return 0.0
+    pos = cluster_positions(labels, cluster_labels)
+    valid = pos >= 0
+    if not valid.all():
+        data, pos = data[valid], pos[valid]
+        if x_sq is not None:
+            x_sq = np.asarray(x_sq)[valid]
+    H = np.asarray(hubs, dtype=np.float64).reshape(k, data.shape[1])
+
+    # 2) Sum of squared distances to the assigned hubs
+    if x_sq is None:
+        diff = np.take(H, pos, axis=0) if out is None else \
+            np.take(H, pos, axis=0, out=_scratch(out, 'diff', (len(pos), H.shape[1]), np.float64))
+        np.subtract(data, diff, out=diff)
+        return float(np.einsum('ij,ij->', diff, diff))
+    # ||x||^2 - 2*x.h + ||h||^2 summed per cluster: only the per-cluster sums of the points are needed
+    sums = np.stack([np.bincount(pos, weights=data[:, c], minlength=k)
+                     for c in range(data.shape[1])], axis=1)
+    counts = np.bincount(pos, minlength=k)
+    return float(np.sum(x_sq) - 2.0 * np.einsum('ij,ij->', sums, H)
+                 + counts @ np.einsum('ij,ij->i', H, H))
+
+def cluster_positions(labels, cluster_labels):
+    """
+    @brief Maps labels to the position of their cluster in `cluster_labels`.
+
+    @param labels: The labels of each data point.
+    @param cluster_labels: The cluster labels, in the order of the hubs.
+    @return: An intp array with the position of every point's cluster, or -1 for labels not listed.
+    """
+    labels = np.asarray(labels)
+    cl = np.asarray(cluster_labels)
+    if cl.size == 0:
+        return np.full(labels.shape, -1, dtype=np.intp)
+    if cl.dtype.kind in 'iu' and labels.dtype.kind == 'i' and cl.min() >= 0 and cl.max() < (1 << 20):
+        # Small non-negative labels: one lookup table instead of a binary search per point
+        slot = np.full(int(cl.max()) + 2, -1, dtype=np.intp)
+        slot[cl[::-1]] = np.arange(cl.size - 1, -1, -1)  # first position wins for repeated labels
+        return slot[np.clip(labels, -1, cl.max() + 1)]
+    order = np.argsort(cl, kind='stable')
+    sorted_cl = cl[order]
+    pos = np.searchsorted(sorted_cl, labels).clip(0, len(cl) - 1)
+    return np.where(sorted_cl[pos] == labels, order[pos], -1).astype(np.intp, copy=False)
 
-def find_cluster_hub_nodes(data, labels, cluster_labels):
+def find_cluster_hub_nodes(data, labels, cluster_labels, x_sq=None, out=None):
     """
     @brief Finds the hub nodes for each cluster.
 
     This function computes the hubs for each cluster by selecting the data points closest to the centroid 
     of each cluster. The hub is defined as the point closest to the cluster's centroid.
 
-    @param data: The data points (numpy array).
+    The centroids are accumulated with `np.bincount` and the closest point of every cluster is
+    found with a grouped minimum (`np.minimum.at`), so all clusters are handled in a few linear
+    passes over the data, without sorting the points by label.
+
+    @param data: The data points (numpy array or any buffer-protocol object, e.g. `Solution.X_mv`).
     @param labels: The labels of each data point indicating the assigned cluster.
     @param cluster_labels: The unique cluster labels for the clustering result.
+    @param x_sq: Optional precomputed squared norms of the data rows, used to rank the
+        points of a cluster by their distance to the centroid without a full recompute.
+    @param out: Optional dictionary of scratch buffers reused between calls (see `_scratch`);
+        the gathered centroids and the distances are then written into it.
     @return: A tuple containing two elements:
         - hubs: An array of hub points, one for each cluster.
         - hub_indices: A list of indices of the hub points.
+    @throws ValueError: If one of the clusters has no points.
+    """
+    data = np.asarray(data)
+    k = len(cluster_labels)
+    if k == 0:
+        return data[:0], []
+
+    # 1) Cluster position of every point; points outside the wanted clusters (e.g. noise) are skipped
+    idx = cluster_positions(labels, cluster_labels)
+    rows = None
+    if not (idx >= 0).all():
+        rows = np.flatnonzero(idx >= 0)
+        idx = idx[rows]
+        pts = data[rows]
+        if x_sq is not None:
+            x_sq = np.asarray(x_sq)[rows]
+    else:
+        pts = data
+    counts = np.bincount(idx, minlength=k)
+    if np.any(counts == 0):
+        raise ValueError("Cannot find a hub for an empty cluster.")
+
+    # 2) Centroids from the per-cluster sums
+    m, dim = pts.shape
+    centroids = np.stack([np.bincount(idx, weights=pts[:, c], minlength=k)
+                          for c in range(dim)], axis=1)
+    centroids /= counts[:, None]
+
+    # 3) Distance of every point to its centroid. Plain differences are computed in the float
+    #    dtype of the data (float32 for `Solution.X`); the expanded form has a cancellation
+    #    term, so it stays in float64
+    dtype = pts.dtype if x_sq is None and pts.dtype.kind == 'f' else np.float64
+    centroids = centroids.astype(dtype, copy=False)
+    if out is None:
+        c_rows = np.take(centroids, idx, axis=0)
+        d2 = np.empty(m, dtype=dtype)
+    else:
+        c_rows = np.take(centroids, idx, axis=0, out=_scratch(out, 'c_rows', (m, dim), dtype))
+        d2 = _scratch(out, 'd2', (m,), dtype)
+    if x_sq is None:
+        np.subtract(c_rows, pts, out=c_rows)
+        np.einsum('ij,ij->i', c_rows, c_rows, out=d2)
+    else:
+        # ||c||^2 is the same for every point in the cluster, so it does not change the argmin
+        np.einsum('ij,ij->i', pts, c_rows, out=d2)
+        d2 *= -2.0
+        d2 += x_sq
+
+    # 4) Grouped argmin: first point of each cluster that reaches the cluster minimum
+    seg_min = np.full(k, np.inf, dtype=dtype)
+    np.minimum.at(seg_min, idx, d2)
+    at_min = np.flatnonzero(d2 == seg_min[idx])
+    first = np.full(k, m, dtype=np.intp)
+    np.minimum.at(first, idx[at_min], at_min)
+    hub_idx = first if rows is None else rows[first]
+    return data[hub_idx], hub_idx.tolist()
+
+# Elements of the (rows, n_hubs) distance block of `nearest_hubs` (128 KiB at float32)
+_NEAREST_BLOCK = 1 << 15
+
+def nearest_hubs(X, hubs):
+    """
+    @brief Returns the index of the nearest hub of every point.
+
+    Uses the compiled kernel when Numba is available (see `kernels.assign_nearest`). The NumPy
+    fallback ranks the hubs by ||h||^2 - 2*x.h (||x||^2 does not change the argmin) and
+    works through the points in row blocks, so that each block of distances stays in cache
+    instead of materialising the whole (n_points, n_hubs) matrix.
+
+    @param X: The data points, a 2-D float array.
+    @param hubs: The hub coordinates, one row per hub.
+    @return: An intp array with the position of the nearest hub of every point.
+    """
+    labels = kernels.assign_nearest(X, hubs)
+    if labels is not None:
+        return labels
+    X = np.asarray(X)
+    H = np.asarray(hubs, dtype=X.dtype).reshape(-1, X.shape[1])
+    h_sq = np.einsum('ij,ij->i', H, H)
+    HT = np.ascontiguousarray(H.T)
+    labels = np.empty(X.shape[0], dtype=np.intp)
+    chunk = max(256, _NEAREST_BLOCK // max(len(H), 1))
+    d2 = np.empty((min(chunk, X.shape[0]), len(H)), dtype=np.result_type(X.dtype, h_sq.dtype))
+    for s in range(0, X.shape[0], chunk):
+        Xc = X[s:s + chunk]
+        D = d2[:len(Xc)]
+        np.matmul(Xc, HT, out=D)
+        D *= -2.0
+        D += h_sq
+        D.argmin(axis=1, out=labels[s:s + len(Xc)])
+    return labels
+
+def group_cluster_indices(labels, cluster_labels):
+    """
+    @brief Groups the point indices of each cluster in a single pass.
+
+    This function sorts the labels once and slices the sorted order per cluster, instead of
+    scanning the whole label array once for every cluster. Labels that are not listed in
+    `cluster_labels` (e.g. DBSCAN noise, label -1) are left out.
+
+    @param labels: The labels of each data point indicating the assigned cluster.
+    @param cluster_labels: The unique cluster labels for the clustering result.
+    @return: A list of index arrays, one for each entry of `cluster_labels`.
+    """
+    labels = np.asarray(labels)
+    order = np.argsort(labels, kind='stable')
+    sorted_labels = labels[order]
+    wanted = np.asarray(cluster_labels, dtype=labels.dtype)
+    starts = np.searchsorted(sorted_labels, wanted, side='left')
+    ends = np.searchsorted(sorted_labels, wanted, side='right')
+    return [order[s:e] for s, e in zip(starts, ends)]
+
+def format_cluster_indices(labels, cluster_labels):
     """
-    hubs = []
-    hub_indices = []
-    for lbl in cluster_labels:
-        mask = (labels == lbl)
-        subset = data[mask]
-        centroid = subset.mean(axis=0)
-        indices = np.where(mask)[0]
-        dists = np.linalg.norm(data[indices] - centroid, axis=1)
-        i_min = np.argmin(dists)
-        hub_idx = indices[i_min]
-        hubs.append(data[hub_idx])
-        hub_indices.append(int(hub_idx))
-    return np.array(hubs), hub_indices
+    @brief Formats the point indices of each cluster for the results panel.
+
+    The indices are grouped with `group_cluster_indices` (one pass over the labels) and the
+    lines are joined once at the end instead of growing a string cluster by cluster.
+
+    @param labels: The labels of each data point indicating the assigned cluster.
+    @param cluster_labels: The unique cluster labels for the clustering result.
+    @return: One "Cluster <label>: [<indices>]" line per cluster, each ending with a newline.
+    """
+    groups = group_cluster_indices(labels, cluster_labels)
+    return "".join(f"Cluster {lbl}: {ids.tolist()}\n" for lbl, ids in zip(cluster_labels, groups))
+
+def write_matrix_tsv(path, arr):
+    """
+    @brief Writes a numeric matrix to a tab-separated text file.
+
+    The rows are formatted by NumPy's numeric writer and go through a 1 MiB write buffer,
+    instead of pandas' per-cell CSV formatting. Nine significant digits are written, which is
+    enough for float32 values to be read back exactly.
+
+    @param path: The path of the file to write.
+    @param arr: The 2-D numeric array to write, one row per line.
+    """
+    with open(path, 'wb', buffering=1 << 20) as f:
+        np.savetxt(f, arr, fmt='%.9g', delimiter='\t')
+
+# pyarrow is optional; it is only imported when a Parquet file is written
+HAVE_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+# File dialog filter of the binary and text formats `write_solution` can write
+SAVE_FILE_FILTER = ("NPZ (*.npz);;" + ("Parquet (*.parquet);;" if HAVE_PYARROW else "")
+                    + "Text Files - slow (*.txt)")
+
+def write_solution(path, sol):
+    """
+    @brief Writes the data of a solution to a file, in the format given by the extension of `path`.
+
+    - `.npz`: NumPy archive with the float32 data (`xs`) and, when present, `labels` and `hubs`.
+    - `.parquet`: Parquet table (zstd) with one column per feature and a `label` column when present; needs pyarrow.
+    - any other extension: tab-separated text, see `write_matrix_tsv`.
+
+    The binary formats store the array as is, without formatting every value as text.
+
+    @param path: The path of the file to write.
+    @param sol: The `Solution` whose data (and result, if any) is written.
+    @throws ValueError: If a Parquet file is requested and pyarrow is not installed.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    X = sol.X
+    if ext == '.npz':
+        arrays = {'xs': X}
+        if sol.labels is not None:
+            arrays['labels'] = np.asarray(sol.labels)
+        if sol.hubs is not None:
+            arrays['hubs'] = np.asarray(sol.hubs)
+        # Uncompressed: zlib would take most of the time and hardly shrinks float data
+        np.savez(path, **arrays)
+    elif ext == '.parquet':
+        if not HAVE_PYARROW:
+            raise ValueError("Saving as Parquet requires the 'pyarrow' package.")
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        columns = {str(j): X[:, j] for j in range(X.shape[1])}
+        if sol.labels is not None:
+            columns['label'] = np.asarray(sol.labels)
+        pq.write_table(pa.table(columns), path, compression='zstd')
+    else:
+        write_matrix_tsv(path, X)
 
 def plot_solution(sol, canvas):
     """
@@ -59,32 +310,64 @@ def plot_solution(sol, canvas):
     @param sol: The `Solution` object that contains the clustering results.
     @param canvas: The matplotlib canvas on which the plot will be drawn.
     """
+    draw_solution(sol, canvas.figure)
+    canvas.draw_idle()
+
+# Largest number of points whose indices are written next to them on a solution plot
+MAX_POINT_LABELS = 200
+
+def draw_solution(sol, fig):
+    """
+    @brief Builds the plot of a clustering solution on a figure without rendering it.
+
+    This is the drawing part of `plot_solution`. It only creates the artists, so it can also be
+    used on a figure that is not attached to any on-screen canvas yet (e.g. from a worker thread).
+
+    All points are drawn by a single scatter collection coloured per cluster. Point indices are only written for plots of up to `MAX_POINT_LABELS` points, since every
+    label is a separate text artist.
+
+    @param sol: The `Solution` object that contains the clustering results.
+    @param fig: The matplotlib figure on which the plot will be built.
+    """
     df = sol.data
-    fig = canvas.figure
-    fig.clf()
-    ax = fig.add_subplot(111)
 
     # Extract x, y arrays
     x = df.iloc[:, 0].to_numpy()
     y = df.iloc[:, 1].to_numpy()
 
-    if not hasattr(sol, 'labels') or sol.labels is None:
-        ax.scatter(x, y, color='black', label='Data')
+    labels = getattr(sol, 'labels', None)
+    labeled = labels is not None
+    hubs = getattr(sol, 'hubs', None) if labeled else None
+    hub_xy = np.asarray(hubs)[:, :2] if hubs is not None and len(hubs) else np.empty((0, 2))
+
+    # One colour per cluster, taken from the default colour cycle
+    if labeled:
+        cycle = plt.rcParams['axes.prop_cycle'].by_key()['color']
+        uniq, inverse = np.unique(labels, return_inverse=True)
+        palette = to_rgba_array([cycle[i % len(cycle)] for i in range(len(uniq))], alpha=0.7)
+        colors = palette[inverse.ravel()]
+        handles = [Line2D([], [], marker='o', linestyle='None', color=palette[i], label=f"C{lbl}")
+                   for i, lbl in enumerate(uniq)]
+        if len(hub_xy):
+            handles.append(Line2D([], [], marker='x', linestyle='None', markersize=10,
+                                  color='red', label='Hubs'))
     else:
-        labels = sol.labels
-        hubs = getattr(sol, 'hubs', None)
-        for lbl in np.unique(labels):
-            mask = labels == lbl
-            ax.scatter(x[mask], y[mask], label=f"C{lbl}", alpha=0.7)
-            for i in np.where(mask)[0]:
-                ax.text(x[i], y[i], str(i), fontsize=8, alpha=0.6)
-        if hubs is not None and len(hubs):
-            ax.scatter(hubs[:, 0], hubs[:, 1], marker='x', s=100, c='red', label='Hubs')
+        colors = to_rgba_array('black')
+        handles = [Line2D([], [], marker='o', linestyle='None', color='black', label='Data')]
+
+    fig.clf()
+    ax = fig.add_subplot(111)
+    # Rasterized, so vector exports (PDF/SVG) embed one image instead of a path per point
+    ax.scatter(x, y, c=colors, rasterized=True)
+    ax.scatter(hub_xy[:, 0], hub_xy[:, 1], marker='x', s=100, c='red')
+    if labeled and len(x) <= MAX_POINT_LABELS:
+        for i in range(len(x)):
+            ax.text(x[i], y[i], str(i), fontsize=8, alpha=0.6)
 
     #ax.set_title("Clustering Solution")
     ax.set_xlabel(df.columns[0])
     ax.set_ylabel(df.columns[1])
-    ax.legend(loc='best')
+    ax.legend(handles=handles, loc='best')
 
     # Manual axis limits with padding
     x_min, x_max = x.min(), x.max()
@@ -93,5 +376,3 @@ def plot_solution(sol, canvas):
     y_pad = (y_max - y_min) * 0.05 if y_max > y_min else 1.0
     ax.set_xlim(x_min - x_pad, x_max + x_pad)
     ax.set_ylim(y_min - y_pad, y_max + y_pad)
-
-    canvas.draw()